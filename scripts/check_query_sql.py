@@ -0,0 +1,134 @@
+"""
+판매/재고 집계 SQL 구조 점검 스크립트 (Snowflake 접속 없이 실행)
+
+각 집계 쿼리를 선택 테이블 환경변수 미설정/설정 두 가지로 생성한 뒤
+- 바인드 파라미터(%(name)s) 치환 가능 여부
+- 괄호 짝
+- WITH 절 CTE 목록 형식 (CTE 사이 쉼표 누락 등)
+을 확인한다. 쿼리 템플릿을 수정한 뒤 전처리 실행 전에 돌려 볼 것.
+
+실행: python scripts/check_query_sql.py
+"""
+
+import io
+import os
+import re
+import sys
+from typing import Dict, List
+
+# Windows 콘솔 UTF-8 인코딩 설정
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+sys.path.append(os.path.dirname(__file__))
+from sales_aggregation import build_sales_aggregation_query
+from inventory_aggregation import build_inventory_aggregation_query
+
+# 쿼리 변형을 만드는 선택 테이블 환경변수 (값은 형식 점검용 더미 테이블명)
+OPTIONAL_TABLE_ENVS = {
+    'SNOWFLAKE_SHOP_DIM_TABLE': 'FNF.CHN.DIM_SHOP_LATEST_CLS',
+    'SNOWFLAKE_SHOP_MAP_TABLE': 'FNF.CHN.DIM_SHOP_CLS_MAP',
+    'SNOWFLAKE_SALES_AGG_TABLE': 'FNF.CHN.AGG_SALES_CLASSIFIED_MONTHLY',
+    'SNOWFLAKE_REMARK_LONG_TABLE': 'FNF.CHN.MST_PRDT_REMARK_LONG',
+}
+
+# (start_month, end_month, reference_month): remark 구간 포함 / remark 구간 밖
+CHECK_WINDOWS = [
+    ('202401', '202603', '202603'),
+    ('202512', '202603', '202603'),
+]
+
+TOKEN_PATTERN = re.compile(r"\w+|\S")
+
+
+def _strip_literals_and_comments(sql: str) -> str:
+    """-- 주석과 '...' 문자열 리터럴 제거 (괄호/쉼표 판단에 섞이지 않도록)"""
+    sql = re.sub(r"'(?:[^']|'')*'", "''", sql)
+    return re.sub(r"--[^\n]*", "", sql)
+
+
+def check_cte_chain(sql: str) -> List[str]:
+    """
+    WITH name AS (...), name AS (...) SELECT ... 형식 점검
+
+    Returns:
+        List[str]: 발견한 오류 메시지 (없으면 빈 리스트)
+    """
+    tokens = TOKEN_PATTERN.findall(_strip_literals_and_comments(sql))
+    errors = []
+
+    depth = 0
+    for token in tokens:
+        depth += (token == '(') - (token == ')')
+        if depth < 0:
+            return ["닫는 괄호가 여는 괄호보다 많음"]
+    if depth != 0:
+        errors.append(f"괄호 짝 불일치 (여는 괄호 {depth}개 초과)")
+
+    if not tokens or tokens[0].upper() != 'WITH':
+        return errors
+
+    i = 1
+    while True:
+        if i + 2 >= len(tokens) or tokens[i + 1].upper() != 'AS' or tokens[i + 2] != '(':
+            errors.append(f"CTE 정의 형식 오류: {' '.join(tokens[i:i + 3])}")
+            return errors
+        name = tokens[i]
+        # CTE 본문의 닫는 괄호까지 건너뜀
+        i += 3
+        depth = 1
+        while i < len(tokens) and depth:
+            depth += (tokens[i] == '(') - (tokens[i] == ')')
+            i += 1
+        following = tokens[i] if i < len(tokens) else ''
+        if following == ',':
+            i += 1
+            continue
+        if following.upper() != 'SELECT':
+            errors.append(f"CTE '{name}' 뒤에 쉼표 누락 (다음 토큰: {following!r})")
+        return errors
+
+
+def check_query(label: str, query: str, params: Dict[str, str]) -> bool:
+    try:
+        rendered = query % params
+    except (KeyError, ValueError, TypeError) as e:
+        print(f"  [FAIL] {label}: 바인드 파라미터 치환 실패 ({e})")
+        return False
+
+    errors = check_cte_chain(rendered)
+    if errors:
+        for error in errors:
+            print(f"  [FAIL] {label}: {error}")
+        return False
+    print(f"  [OK] {label}")
+    return True
+
+
+def main() -> int:
+    builders = [
+        ('판매', build_sales_aggregation_query),
+        ('재고', build_inventory_aggregation_query),
+    ]
+    ok = True
+    for with_tables in (False, True):
+        for env, table in OPTIONAL_TABLE_ENVS.items():
+            if with_tables:
+                os.environ[env] = table
+            else:
+                os.environ.pop(env, None)
+        variant = '선택 테이블 사용' if with_tables else '인라인 계산'
+        print(f"\n[{variant}]")
+        for name, builder in builders:
+            for start_month, end_month, reference_month in CHECK_WINDOWS:
+                query, params = builder(start_month, end_month, reference_month)
+                label = f"{name} {start_month}~{end_month} (ref={reference_month})"
+                ok = check_query(label, query, params) and ok
+
+    print("\n점검 완료" if ok else "\n[ERROR] SQL 구조 오류 발견")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+/*
+ * DW_SALE 클러스터링 키 점검 / 설정
+ *
+ * 목적: 판매 집계 쿼리(sales_aggregation.py)의 sale_dt 범위 + brd_cd 필터가
+ *       micro-partition pruning으로 조회 월의 파티션만 읽도록 DW_SALE 정렬 상태 확인 및 개선
+ *
+ * 참고: 클러스터링 키 설정은 DW 테이블 소유 Role 권한이 필요하고, 이후 Automatic Clustering이
+ *       백그라운드 credit을 소모하므로 1번 점검 결과(average_depth가 높고 pruning이 약할 때)를 보고 적용
+ *       카디널리티가 낮은 식을 앞에 두도록 권장 → 월 단위(DATE_TRUNC) 후 brd_cd
+ *
+ * 실행: DW_SALE OWNERSHIP Role로 Snowflake 콘솔에서 직접 실행 (인프라 변경)
+ */
+
+USE DATABASE FNF;
+USE SCHEMA CHN;
+
+-- ==================================================
+-- 1. 현재 클러스터링 상태 점검 (sale_dt 월 기준)
+-- ==================================================
+SELECT SYSTEM$CLUSTERING_INFORMATION('CHN.DW_SALE', '(DATE_TRUNC(''month'', sale_dt), brd_cd)');
+
+-- 단일 월 조회 시 스캔 파티션 비율 확인 (실행 후 Query Profile의 Partitions scanned / total 확인)
+SELECT COUNT(*)
+FROM CHN.DW_SALE
+WHERE sale_dt >= DATE '2025-11-01'
+  AND sale_dt < DATE '2025-12-01'
+  AND brd_cd IN ('M', 'I', 'X');
+
+-- ==================================================
+-- 2. 클러스터링 키 설정 (점검 결과 pruning이 약한 경우에만)
+-- ==================================================
+ALTER TABLE CHN.DW_SALE CLUSTER BY (DATE_TRUNC('month', sale_dt), brd_cd);
+
+-- ==================================================
+-- 3. 재점검 (Automatic Clustering 반영 후)
+-- ==================================================
+SELECT SYSTEM$CLUSTERING_INFORMATION('CHN.DW_SALE');
@@ -0,0 +1,55 @@
+/*
+ * 상품별 분기 remark(remark1~8) 세로형 룩업 테이블
+ *
+ * 목적: 판매/재고 집계 쿼리(sales_aggregation.py, inventory_aggregation.py)가 원천 행마다
+ *       MST_PRDT_SCS의 remark1~8 여덟 컬럼을 모두 조인해 들고 온 뒤 하나만 고르지 않도록
+ *       (prdt_scs_cd, remark_num) → op_std 한 칸만 조인
+ *
+ * 참고: remark_num은 집계 쿼리와 동일하게 23.12 기준 3개월 단위 (1 = 23.12~24.02 … 8 = 25.09~25.11, 25.12~는 9 이상으로 룩업 대상 아님)
+ *       UNPIVOT은 NULL remark를 제외하므로 해당 분기 행이 없으면 조인 결과 op_std는 NULL (기존과 동일)
+ *       기준월 MST 실시간 operate_standard는 계속 MST_PRDT_SCS에서 직접 조인
+ *
+ * 실행: CREATE TABLE / CREATE TASK 권한이 있는 Role로 Snowflake 콘솔에서 직접 실행
+ *       TASK의 WAREHOUSE = <SNOWFLAKE_WAREHOUSE>는 실행 전 실제 warehouse 이름으로 바꿀 것
+ * 적용: .env.local에 SNOWFLAKE_REMARK_LONG_TABLE=FNF.CHN.MST_PRDT_REMARK_LONG 설정
+ *       (미설정 시 집계 쿼리는 MST_PRDT_SCS의 remark1~8을 배열 인덱스로 선택)
+ */
+
+USE DATABASE FNF;
+USE SCHEMA CHN;
+
+-- ==================================================
+-- 1. 룩업 테이블 생성 (prdt_scs_cd, remark_num)당 1행
+-- ==================================================
+CREATE OR REPLACE TABLE FNF.CHN.MST_PRDT_REMARK_LONG AS
+SELECT
+  prdt_scs_cd,
+  TO_NUMBER(SUBSTR(remark_col, 7)) AS remark_num,  -- 'REMARK3' → 3
+  op_std::VARCHAR AS op_std
+FROM FNF.CHN.MST_PRDT_SCS
+UNPIVOT (op_std FOR remark_col IN (remark1, remark2, remark3, remark4, remark5, remark6, remark7, remark8));
+
+-- ==================================================
+-- 2. 일 1회 갱신 TASK (매일 06:00 Asia/Shanghai)
+-- ==================================================
+CREATE OR REPLACE TASK FNF.CHN.TASK_REFRESH_MST_PRDT_REMARK_LONG
+  WAREHOUSE = <SNOWFLAKE_WAREHOUSE>  -- 실행 전 .env.local의 SNOWFLAKE_WAREHOUSE 값으로 변경
+  SCHEDULE = 'USING CRON 0 6 * * * Asia/Shanghai'
+AS
+  INSERT OVERWRITE INTO FNF.CHN.MST_PRDT_REMARK_LONG
+  SELECT
+    prdt_scs_cd,
+    TO_NUMBER(SUBSTR(remark_col, 7)) AS remark_num,
+    op_std::VARCHAR AS op_std
+  FROM FNF.CHN.MST_PRDT_SCS
+  UNPIVOT (op_std FOR remark_col IN (remark1, remark2, remark3, remark4, remark5, remark6, remark7, remark8));
+
+ALTER TASK FNF.CHN.TASK_REFRESH_MST_PRDT_REMARK_LONG RESUME;
+
+-- ==================================================
+-- 3. 확인 (remark_num별 상품 수)
+-- ==================================================
+SELECT remark_num, COUNT(*) AS prdt_count
+FROM FNF.CHN.MST_PRDT_REMARK_LONG
+GROUP BY remark_num
+ORDER BY remark_num;
@@ -0,0 +1,155 @@
+/*
+ * 판매 주력/아울렛 판정 결과 월별 사전 집계 테이블
+ *
+ * 목적: 판매 집계 쿼리(sales_aggregation.py)가 매 실행마다 DW_SALE 원천 전체에
+ *       MST/HST 조인 → operate_standard 선택 → 주력/아울렛 판정 → 집계를 반복하지 않도록
+ *       마감월(당월 이전) 결과를 (sale_ym, brd_cd, prdt_kind_nm_en, fr_or_cls, product_type) 단위로 미리 저장
+ *
+ * 참고: Snowflake MATERIALIZED VIEW는 조인/윈도우 함수(QUALIFY ROW_NUMBER)를 지원하지 않으므로
+ *       일반 테이블 + 일 1회 TASK 갱신으로 구성
+ *       마감월은 기준월과 무관하게 remark1~8(24.01~25.11) 또는 HST 익월 스냅샷(25.12~)으로만 판정되므로
+ *       기준월(MST 실시간) 이후 구간만 집계 쿼리에서 원천으로 계산하면 결과가 동일함
+ *       집계 쿼리는 테이블의 MAX(sale_ym) 다음 월부터 원천으로 계산하므로
+ *       월초 TASK 갱신 전에도 직전 마감월이 누락되지 않음
+ *
+ * 실행: CREATE TABLE / CREATE TASK 권한이 있는 Role로 Snowflake 콘솔에서 직접 실행
+ *       TASK의 WAREHOUSE = <SNOWFLAKE_WAREHOUSE>는 실행 전 실제 warehouse 이름으로 바꿀 것
+ * 적용: .env.local에 SNOWFLAKE_SALES_AGG_TABLE=FNF.CHN.AGG_SALES_CLASSIFIED_MONTHLY 설정
+ *       (미설정 시 집계 쿼리는 전체 기간을 원천에서 계산)
+ */
+
+USE DATABASE FNF;
+USE SCHEMA CHN;
+
+-- ==================================================
+-- 1. 사전 집계 테이블 생성 (판매 집계 쿼리의 Step 1~2와 동일 로직, 당월 이전만)
+-- ==================================================
+CREATE OR REPLACE TABLE FNF.CHN.AGG_SALES_CLASSIFIED_MONTHLY (
+  sale_ym          VARCHAR(6),
+  brd_cd           VARCHAR,
+  prdt_kind_nm_en  VARCHAR,
+  fr_or_cls        VARCHAR,
+  product_type     VARCHAR,
+  total_amount     NUMBER(38, 2)
+);
+
+-- ==================================================
+-- 2. 일 1회 갱신 TASK (매일 06:30 Asia/Shanghai, 매장 디멘션 갱신 이후)
+-- ==================================================
+CREATE OR REPLACE TASK FNF.CHN.TASK_REFRESH_AGG_SALES_CLASSIFIED_MONTHLY
+  WAREHOUSE = <SNOWFLAKE_WAREHOUSE>  -- 실행 전 .env.local의 SNOWFLAKE_WAREHOUSE 값으로 변경
+  SCHEDULE = 'USING CRON 30 6 * * * Asia/Shanghai'
+AS
+  INSERT OVERWRITE INTO FNF.CHN.AGG_SALES_CLASSIFIED_MONTHLY
+  WITH
+  acc_item_map AS (
+    SELECT DISTINCT ITEM, PRDT_KIND_NM_ENG
+    FROM FNF.PRCS.DB_PRDT
+    WHERE PARENT_PRDT_KIND_NM_ENG = 'ACC'
+  ),
+  shop_detail AS (
+    SELECT shop_id, oa_shop_id, oa_map_shop_id, fr_or_cls, open_dt
+    FROM CHN.DW_SHOP_WH_DETAIL
+    WHERE fr_or_cls IS NOT NULL
+  ),
+  shop_cls_map AS (
+    SELECT map_key, fr_or_cls
+    FROM (
+      SELECT TO_VARCHAR(oa_map_shop_id) AS map_key, 1 AS priority, fr_or_cls, open_dt
+      FROM shop_detail WHERE oa_map_shop_id IS NOT NULL
+      UNION ALL
+      SELECT TO_VARCHAR(oa_shop_id) AS map_key, 2 AS priority, fr_or_cls, open_dt
+      FROM shop_detail WHERE oa_shop_id IS NOT NULL
+      UNION ALL
+      SELECT TO_VARCHAR(shop_id) AS map_key, 3 AS priority, fr_or_cls, open_dt
+      FROM shop_detail WHERE shop_id IS NOT NULL
+    )
+    QUALIFY ROW_NUMBER() OVER(
+      PARTITION BY map_key
+      ORDER BY priority, open_dt DESC NULLS LAST
+    ) = 1
+  ),
+  op_std_dim AS (
+    SELECT op_std, fixed_type
+    FROM (VALUES
+      ('FOCUS', 'core'),
+      ('INTRO', 'core'),
+      ('OUTLET', 'outlet'),
+      ('CARE', 'outlet'),
+      ('DONE', 'outlet')
+    ) AS v(op_std, fixed_type)
+  ),
+  sales_with_master AS (
+    SELECT
+      TO_CHAR(s.sale_dt, 'YYYYMM') AS sale_ym,
+      s.brd_cd,
+      s.tag_amt,
+      db.PRDT_KIND_NM_ENG AS prdt_kind_nm_en,
+      sm.fr_or_cls,
+      FLOOR(((YEAR(s.sale_dt) - 2023) * 12 + MONTH(s.sale_dt) - 12) / 3) + 1 AS remark_num,
+      YEAR(s.sale_dt) - 2000 AS row_yy_n,
+      TRY_TO_NUMBER(LEFT(s.sesn, 2)) AS sesn_yy,
+      CASE
+        -- 25.12 ~ 당월 미만: HST 익월 스냅샷
+        WHEN sale_ym >= '202512' THEN hst.operate_standard
+        -- 24.01~25.11: 분기별 remark (remark1~8)
+        ELSE GET(
+          ARRAY_CONSTRUCT(p.remark1, p.remark2, p.remark3, p.remark4, p.remark5, p.remark6, p.remark7, p.remark8),
+          remark_num - 1
+        )::VARCHAR
+      END AS op_std
+    FROM CHN.DW_SALE s
+    INNER JOIN acc_item_map db ON SUBSTR(s.prdt_scs_cd, 7, 2) = db.ITEM
+    INNER JOIN shop_cls_map sm
+      ON TO_VARCHAR(s.shop_id) = sm.map_key
+      AND sm.fr_or_cls IN ('FR', 'OR')
+    LEFT JOIN FNF.CHN.MST_PRDT_SCS p ON s.prdt_scs_cd = p.prdt_scs_cd
+    LEFT JOIN FNF.CHN.HST_PRDT_SCS hst
+      ON s.prdt_scs_cd = hst.prdt_scs_cd
+      AND hst.yyyymm = CASE
+        WHEN s.sale_dt >= DATE '2025-12-01'
+          THEN TO_VARCHAR(ADD_MONTHS(DATE_TRUNC('month', s.sale_dt), 1), 'YYYYMM')
+        ELSE NULL
+      END
+    WHERE s.sale_dt >= DATE '2023-12-01'
+      AND s.sale_dt < DATE_TRUNC('month', CURRENT_DATE())
+      AND s.brd_cd IN ('M', 'I', 'X')
+  ),
+  sales_classified AS (
+    SELECT
+      r.sale_ym,
+      r.brd_cd,
+      r.prdt_kind_nm_en,
+      r.fr_or_cls,
+      r.tag_amt,
+      COALESCE(
+        d.fixed_type,
+        CASE
+          WHEN r.op_std IS NOT NULL THEN
+            CASE
+              WHEN TRY_TO_NUMBER(REGEXP_SUBSTR(r.op_std, '\\d{2}')) >= r.row_yy_n THEN 'core'
+              ELSE 'outlet'
+            END
+          WHEN r.sesn_yy >= r.row_yy_n THEN 'core'
+          ELSE 'outlet'
+        END
+      ) AS product_type
+    FROM sales_with_master r
+    LEFT JOIN op_std_dim d ON r.op_std = d.op_std
+  )
+  SELECT sale_ym, brd_cd, prdt_kind_nm_en, fr_or_cls, product_type, SUM(tag_amt) AS total_amount
+  FROM sales_classified
+  GROUP BY sale_ym, brd_cd, prdt_kind_nm_en, fr_or_cls, product_type;
+
+ALTER TASK FNF.CHN.TASK_REFRESH_AGG_SALES_CLASSIFIED_MONTHLY RESUME;
+
+-- 최초 1회 즉시 적재 (TASK 스케줄 대기 없이)
+EXECUTE TASK FNF.CHN.TASK_REFRESH_AGG_SALES_CLASSIFIED_MONTHLY;
+
+-- ==================================================
+-- 3. 확인
+-- ==================================================
+SELECT sale_ym, brd_cd, COUNT(*) AS row_count, SUM(total_amount) AS total_amount
+FROM FNF.CHN.AGG_SALES_CLASSIFIED_MONTHLY
+GROUP BY sale_ym, brd_cd
+ORDER BY sale_ym, brd_cd;
@@ -0,0 +1,84 @@
+/*
+ * 판매 매장 키 → 채널 구분(fr_or_cls) 매핑 테이블
+ *
+ * 목적: 판매 집계 쿼리(sales_aggregation.py)가 매 실행마다 DW_SHOP_WH_DETAIL을 읽어
+ *       oa_map_shop_id → oa_shop_id → shop_id 우선순위 매핑과 ROW_NUMBER 윈도우 정렬을
+ *       반복하지 않도록 map_key → fr_or_cls 결과를 미리 저장
+ *
+ * 참고: 재고용 DIM_SHOP_LATEST_CLS(shop_id 단일 키)와 달리 판매 shop_id는 세 가지 키 중
+ *       처음 매칭되는 값을 사용하므로 별도 테이블로 구성
+ *       Snowflake MATERIALIZED VIEW는 윈도우 함수(QUALIFY ROW_NUMBER)를 지원하지 않으므로
+ *       일반 테이블 + 일 1회 TASK 갱신으로 구성
+ *
+ * 실행: CREATE TABLE / CREATE TASK 권한이 있는 Role로 Snowflake 콘솔에서 직접 실행
+ *       TASK의 WAREHOUSE = <SNOWFLAKE_WAREHOUSE>는 실행 전 실제 warehouse 이름으로 바꿀 것
+ * 적용: .env.local에 SNOWFLAKE_SHOP_MAP_TABLE=FNF.CHN.DIM_SHOP_CLS_MAP 설정
+ *       (미설정 시 집계 쿼리는 기존 인라인 CTE를 그대로 사용)
+ */
+
+USE DATABASE FNF;
+USE SCHEMA CHN;
+
+-- ==================================================
+-- 1. 매핑 테이블 생성 (판매 쿼리의 shop_cls_map CTE와 동일 로직)
+-- ==================================================
+CREATE OR REPLACE TABLE FNF.CHN.DIM_SHOP_CLS_MAP AS
+WITH shop_detail AS (
+  SELECT shop_id, oa_shop_id, oa_map_shop_id, fr_or_cls, open_dt
+  FROM CHN.DW_SHOP_WH_DETAIL
+  WHERE fr_or_cls IS NOT NULL
+)
+SELECT map_key, fr_or_cls
+FROM (
+  SELECT TO_VARCHAR(oa_map_shop_id) AS map_key, 1 AS priority, fr_or_cls, open_dt
+  FROM shop_detail WHERE oa_map_shop_id IS NOT NULL
+  UNION ALL
+  SELECT TO_VARCHAR(oa_shop_id) AS map_key, 2 AS priority, fr_or_cls, open_dt
+  FROM shop_detail WHERE oa_shop_id IS NOT NULL
+  UNION ALL
+  SELECT TO_VARCHAR(shop_id) AS map_key, 3 AS priority, fr_or_cls, open_dt
+  FROM shop_detail WHERE shop_id IS NOT NULL
+)
+QUALIFY ROW_NUMBER() OVER(
+  PARTITION BY map_key
+  ORDER BY priority, open_dt DESC NULLS LAST
+) = 1;
+
+-- ==================================================
+-- 2. 일 1회 갱신 TASK (매일 06:00 Asia/Shanghai)
+-- ==================================================
+CREATE OR REPLACE TASK FNF.CHN.TASK_REFRESH_DIM_SHOP_CLS_MAP
+  WAREHOUSE = <SNOWFLAKE_WAREHOUSE>  -- 실행 전 .env.local의 SNOWFLAKE_WAREHOUSE 값으로 변경
+  SCHEDULE = 'USING CRON 0 6 * * * Asia/Shanghai'
+AS
+  INSERT OVERWRITE INTO FNF.CHN.DIM_SHOP_CLS_MAP
+  WITH shop_detail AS (
+    SELECT shop_id, oa_shop_id, oa_map_shop_id, fr_or_cls, open_dt
+    FROM CHN.DW_SHOP_WH_DETAIL
+    WHERE fr_or_cls IS NOT NULL
+  )
+  SELECT map_key, fr_or_cls
+  FROM (
+    SELECT TO_VARCHAR(oa_map_shop_id) AS map_key, 1 AS priority, fr_or_cls, open_dt
+    FROM shop_detail WHERE oa_map_shop_id IS NOT NULL
+    UNION ALL
+    SELECT TO_VARCHAR(oa_shop_id) AS map_key, 2 AS priority, fr_or_cls, open_dt
+    FROM shop_detail WHERE oa_shop_id IS NOT NULL
+    UNION ALL
+    SELECT TO_VARCHAR(shop_id) AS map_key, 3 AS priority, fr_or_cls, open_dt
+    FROM shop_detail WHERE shop_id IS NOT NULL
+  )
+  QUALIFY ROW_NUMBER() OVER(
+    PARTITION BY map_key
+    ORDER BY priority, open_dt DESC NULLS LAST
+  ) = 1;
+
+ALTER TASK FNF.CHN.TASK_REFRESH_DIM_SHOP_CLS_MAP RESUME;
+
+-- ==================================================
+-- 3. 확인
+-- ==================================================
+SELECT fr_or_cls, COUNT(*) AS key_count
+FROM FNF.CHN.DIM_SHOP_CLS_MAP
+GROUP BY fr_or_cls
+ORDER BY fr_or_cls;
@@ -0,0 +1,50 @@
+/*
+ * 매장별 최신 채널 구분(fr_or_cls) 디멘션 테이블
+ *
+ * 목적: 재고 집계 쿼리(inventory_aggregation.py)가 매 실행마다
+ *       DW_SHOP_WH_DETAIL 전체에 ROW_NUMBER 윈도우 정렬을 수행하지 않도록
+ *       shop_id → fr_or_cls 결과를 미리 저장
+ *
+ * 참고: Snowflake MATERIALIZED VIEW는 윈도우 함수(QUALIFY ROW_NUMBER)를 지원하지 않으므로
+ *       일반 테이블 + 일 1회 TASK 갱신으로 구성
+ *
+ * 실행: CREATE TABLE / CREATE TASK 권한이 있는 Role로 Snowflake 콘솔에서 직접 실행
+ *       TASK의 WAREHOUSE = <SNOWFLAKE_WAREHOUSE>는 실행 전 실제 warehouse 이름으로 바꿀 것
+ * 적용: .env.local에 SNOWFLAKE_SHOP_DIM_TABLE=FNF.CHN.DIM_SHOP_LATEST_CLS 설정
+ *       (미설정 시 집계 쿼리는 기존 인라인 서브쿼리를 그대로 사용)
+ */
+
+USE DATABASE FNF;
+USE SCHEMA CHN;
+
+-- ==================================================
+-- 1. 디멘션 테이블 생성 (재고 쿼리의 인라인 서브쿼리와 동일 로직)
+-- ==================================================
+CREATE OR REPLACE TABLE FNF.CHN.DIM_SHOP_LATEST_CLS AS
+SELECT shop_id, fr_or_cls
+FROM CHN.DW_SHOP_WH_DETAIL
+WHERE fr_or_cls IS NOT NULL
+QUALIFY ROW_NUMBER() OVER(PARTITION BY shop_id ORDER BY COALESCE(open_dt, '1900-01-01') DESC) = 1;
+
+-- ==================================================
+-- 2. 일 1회 갱신 TASK (매일 06:00 Asia/Shanghai)
+-- ==================================================
+CREATE OR REPLACE TASK FNF.CHN.TASK_REFRESH_DIM_SHOP_LATEST_CLS
+  WAREHOUSE = <SNOWFLAKE_WAREHOUSE>  -- 실행 전 .env.local의 SNOWFLAKE_WAREHOUSE 값으로 변경
+  SCHEDULE = 'USING CRON 0 6 * * * Asia/Shanghai'
+AS
+  INSERT OVERWRITE INTO FNF.CHN.DIM_SHOP_LATEST_CLS
+  SELECT shop_id, fr_or_cls
+  FROM CHN.DW_SHOP_WH_DETAIL
+  WHERE fr_or_cls IS NOT NULL
+  QUALIFY ROW_NUMBER() OVER(PARTITION BY shop_id ORDER BY COALESCE(open_dt, '1900-01-01') DESC) = 1;
+
+ALTER TASK FNF.CHN.TASK_REFRESH_DIM_SHOP_LATEST_CLS RESUME;
+
+-- ==================================================
+-- 3. 확인
+-- ==================================================
+SELECT fr_or_cls, COUNT(*) AS shop_count
+FROM FNF.CHN.DIM_SHOP_LATEST_CLS
+GROUP BY fr_or_cls
+ORDER BY fr_or_cls;
@@ -7,9 +7,11 @@
 - 금액 + 수량 모두 집계
 """
 
+import os
+import sys
 from typing import Dict, Tuple, Any, Set
-from collections import defaultdict
-from snowflake_utils import execute_query_batch
+import pandas as pd
+from snowflake_utils import execute_query_pandas_cached
 
 
 # 브랜드 코드 매핑 (sales_aggregation과 동일)
@@ -19,14 +21,28 @@ BRAND_CODE_MAP = {
     'X': 'DISCOVERY'
 }
 
+# 매장별 최신 fr_or_cls (SNOWFLAKE_SHOP_DIM_TABLE 미설정 시 쿼리마다 인라인 계산)
+SHOP_LATEST_CLS_SUBQUERY = """(
+    SELECT shop_id, fr_or_cls
+    FROM CHN.DW_SHOP_WH_DETAIL
+    WHERE fr_or_cls IS NOT NULL
+    QUALIFY ROW_NUMBER() OVER(PARTITION BY shop_id ORDER BY COALESCE(open_dt, '1900-01-01') DESC) = 1
+  )"""
+
+# 분기 remark 세로형 룩업 테이블 (create_prdt_remark_long.sql로 생성, 미설정 시 remark1~8 배열 인덱스 선택)
+REMARK_LONG_TABLE_ENV = 'SNOWFLAKE_REMARK_LONG_TABLE'
+
+# agg_dict 키 구성 순서: (brand, item_tab, month, channel_group, product_type)
+AGG_KEY_COLUMNS = ['brand', 'item_tab', 'month', 'channel', 'product_type']
+
 
 def build_inventory_aggregation_query(
     start_month: str = '202401',
     end_month: str = '202511',
     reference_month: str = '202603'
-) -> str:
+) -> Tuple[str, Dict[str, str]]:
     """
-    재고 집계 SQL 쿼리 생성
+    재고 집계 SQL 쿼리 + 바인드 파라미터 생성
 
     Args:
         start_month: 시작월 (YYYYMM)
@@ -34,7 +50,7 @@ def build_inventory_aggregation_query(
         reference_month: 기준월 (YYYYMM). 이 월은 MST 실시간, 이전 25.12~는 PREP 익월 스냅샷 사용.
 
     Returns:
-        str: 실행할 SQL 쿼리
+        Tuple[str, Dict]: 실행할 SQL 쿼리 (월 값은 %(name)s 바인드 변수), 바인드 파라미터
 
     Note:
         operate_standard 소스 규칙:
@@ -42,7 +58,30 @@ def build_inventory_aggregation_query(
         - 25.12 <= 행_월 < reference_month → HST_PRDT_SCS.operate_standard 익월 (행_월+1)
           (구 PREP_MST_PRDT_SCS 폐지, HST_PRDT_SCS로 이관됨 - 스키마 동일)
         - 24.01 ~ 25.11 → remark1~8 (분기별 고정)
+
+        매장 채널 구분은 SNOWFLAKE_SHOP_DIM_TABLE(create_shop_latest_cls.sql로 생성한
+        일 1회 갱신 테이블)이 설정되어 있으면 그 테이블을 조인하고,
+        없으면 DW_SHOP_WH_DETAIL에서 인라인으로 최신 행을 계산한다.
+        SNOWFLAKE_REMARK_LONG_TABLE(create_prdt_remark_long.sql로 생성)이 설정되면
+        remark1~8은 (prdt_scs_cd, remark_num) 룩업 한 칸만 조인한다.
     """
+    shop_latest_cls = os.getenv('SNOWFLAKE_SHOP_DIM_TABLE') or SHOP_LATEST_CLS_SUBQUERY
+
+    remark_long_table = os.getenv(REMARK_LONG_TABLE_ENV)
+    if remark_long_table:
+        # 행_월의 remark_num과 일치하는 remark 한 칸만 조인 (SELECT 별칭은 ON 절에서 참조 불가 → 식 반복)
+        remark_join = f"""
+  LEFT JOIN {remark_long_table} rl
+    ON st.prdt_scs_cd = rl.prdt_scs_cd
+    AND rl.remark_num = FLOOR(((CAST(LEFT(st.yymm, 4) AS INT) - 2023) * 12 + CAST(SUBSTR(st.yymm, 5, 2) AS INT) - 12) / 3) + 1"""
+        remark_op_std = "rl.op_std"
+    else:
+        remark_join = ""
+        remark_op_std = """GET(
+        ARRAY_CONSTRUCT(p.remark1, p.remark2, p.remark3, p.remark4, p.remark5, p.remark6, p.remark7, p.remark8),
+        remark_num - 1
+      )::VARCHAR"""
+
     query = f"""
 WITH 
 -- ACC 아이템 맵: DB_PRDT에서 DISTINCT ITEM, PRDT_KIND_NM_ENG 추출
@@ -52,82 +91,57 @@ acc_item_map AS (
   WHERE PARENT_PRDT_KIND_NM_ENG = 'ACC'
 ),
 
--- Step 1: 재고 데이터에 상품/매장 마스터 조인 및 remark 자동 계산
+-- Step 1: 재고 데이터에 상품/매장 마스터 조인 및 동적 operate_standard(op_std) 선택
 -- operate_standard 규칙:
---   행_월 = {reference_month} → MST 실시간 (p.operate_standard)
---   25.12 <= 행_월 < {reference_month} → HST 익월 스냅샷 (ADD_MONTHS 1) — 구 PREP_MST_PRDT_SCS 대체
+--   행_월 = 기준월 → MST 실시간 (p.operate_standard)
+--   25.12 <= 행_월 < 기준월 → HST 익월 스냅샷 (ADD_MONTHS 1) — 구 PREP_MST_PRDT_SCS 대체
 --   24.01 ~ 25.11 → remark1~8
+-- op_std를 이 단계에서 바로 계산하여 remark1~8 등 넓은 컬럼이 이후 CTE로 전파되지 않도록 함
 stock_with_master AS (
   SELECT
     st.yymm,
-    st.shop_id,
-    st.prdt_scs_cd,
     st.brd_cd,
-    st.sesn,
     st.stock_qty_expected,
     COALESCE(st.stock_tag_amt_insp, 0) + COALESCE(st.stock_tag_amt_frozen, 0) + COALESCE(st.stock_tag_amt_expected, 0) AS stock_tag_amt_total,
     db.PRDT_KIND_NM_ENG AS prdt_kind_nm_en,
     d.fr_or_cls,
     -- remark 번호 자동 계산 (23.12 기준, 3개월 단위) → remark1~8: 24.01~25.11
-    FLOOR(DATEDIFF('month', TO_DATE('202312', 'YYYYMM'), TO_DATE(st.yymm || '01', 'YYYYMMDD')) / 3) + 1 AS remark_num,
-    -- 연도 YY 추출 (202401 → 24)
-    SUBSTR(st.yymm, 3, 2) AS row_yy,
-    p.remark1, p.remark2, p.remark3, p.remark4, p.remark5,
-    p.remark6, p.remark7, p.remark8,
-    -- MST 실시간 operate_standard (기준월에 사용)
-    p.operate_standard AS mst_operate_standard,
-    -- HST 익월 스냅샷 (25.12 ~ 기준월 미만에 사용, 구 PREP_MST_PRDT_SCS 대체)
-    hst.operate_standard AS prep_operate_standard
+    -- 23.12 기준 경과 개월수를 날짜 파싱 없이 정수 연산으로 계산
+    FLOOR(((CAST(LEFT(st.yymm, 4) AS INT) - 2023) * 12 + CAST(SUBSTR(st.yymm, 5, 2) AS INT) - 12) / 3) + 1 AS remark_num,
+    -- 연도 YY 숫자 추출 (202401 → 24), 시즌 YY 숫자 추출 (24SS → 24): 판정 단계에서 정수 비교만 수행
+    TRY_TO_NUMBER(SUBSTR(st.yymm, 3, 2)) AS row_yy_n,
+    TRY_TO_NUMBER(LEFT(st.sesn, 2)) AS sesn_yy,
+    CASE
+      -- 기준월: MST 실시간
+      WHEN st.yymm = %(reference_month)s THEN p.operate_standard
+      -- 25.12 ~ 기준월 미만: HST 익월 스냅샷 (구 PREP)
+      WHEN st.yymm >= '202512' AND st.yymm < %(reference_month)s THEN hst.operate_standard
+      -- 24.01~25.11: 분기별 remark (remark1~8) → 배열 인덱스 또는 룩업 테이블로 선택 (범위 밖이면 NULL)
+      ELSE {remark_op_std}
+    END AS op_std
   FROM CHN.DW_STOCK_M st
-  LEFT JOIN FNF.CHN.MST_PRDT_SCS p ON st.prdt_scs_cd = p.prdt_scs_cd
-  LEFT JOIN acc_item_map db ON SUBSTR(st.prdt_scs_cd, 7, 2) = db.ITEM
-  LEFT JOIN (
-    SELECT shop_id, fr_or_cls
-    FROM CHN.DW_SHOP_WH_DETAIL
-    WHERE fr_or_cls IS NOT NULL
-    QUALIFY ROW_NUMBER() OVER(PARTITION BY shop_id ORDER BY COALESCE(open_dt, '1900-01-01') DESC) = 1
-  ) d ON st.shop_id = d.shop_id
+  -- 필터 역할 조인은 INNER JOIN으로 먼저 수행 (ACC 아이템 / FR·OR·HQ 매장만 남긴 뒤 마스터 조인)
+  INNER JOIN acc_item_map db ON SUBSTR(st.prdt_scs_cd, 7, 2) = db.ITEM  -- ACC 필터
+  INNER JOIN {shop_latest_cls} d
+    ON st.shop_id = d.shop_id
+    AND d.fr_or_cls IN ('FR', 'OR', 'HQ')  -- HQ 포함
+  LEFT JOIN FNF.CHN.MST_PRDT_SCS p ON st.prdt_scs_cd = p.prdt_scs_cd{remark_join}
   -- HST 익월 조인 (구 PREP): 25.12 <= 행_월 < 기준월만 매칭, 기준월은 NULL (MST 사용)
   LEFT JOIN FNF.CHN.HST_PRDT_SCS hst
     ON st.prdt_scs_cd = hst.prdt_scs_cd
     AND hst.yyyymm = CASE
-      WHEN st.yymm >= '202512' AND st.yymm < '{reference_month}'
+      WHEN st.yymm >= '202512' AND st.yymm < %(reference_month)s
         THEN TO_VARCHAR(ADD_MONTHS(TO_DATE(st.yymm || '01', 'YYYYMMDD'), 1), 'YYYYMM')
       ELSE NULL
     END
-  WHERE st.yymm >= '{start_month}'
-    AND st.yymm <= '{end_month}'
+  WHERE st.yymm BETWEEN %(start_month)s AND %(end_month)s
     AND st.brd_cd IN ('M', 'I', 'X')
-    AND db.ITEM IS NOT NULL -- ACC 필터
-    AND d.fr_or_cls IN ('FR', 'OR', 'HQ')  -- HQ 포함
-),
-
--- Step 2: 동적 operate_standard 선택
--- 24.01~25.11: remark1~8, 25.12~(기준월 미만): HST 익월(구 PREP), 기준월: MST 실시간
-stock_with_remark AS (
-  SELECT
-    s.*,
-    CASE
-      -- 기준월: MST 실시간
-      WHEN s.yymm = '{reference_month}' THEN s.mst_operate_standard
-      -- 25.12 ~ 기준월 미만: HST 익월 스냅샷 (구 PREP)
-      WHEN s.yymm >= '202512' AND s.yymm < '{reference_month}' THEN s.prep_operate_standard
-      -- 24.01~25.11: 분기별 remark (remark1~8)
-      WHEN s.remark_num = 1 THEN s.remark1
-      WHEN s.remark_num = 2 THEN s.remark2
-      WHEN s.remark_num = 3 THEN s.remark3
-      WHEN s.remark_num = 4 THEN s.remark4
-      WHEN s.remark_num = 5 THEN s.remark5
-      WHEN s.remark_num = 6 THEN s.remark6
-      WHEN s.remark_num = 7 THEN s.remark7
-      WHEN s.remark_num = 8 THEN s.remark8
-      ELSE NULL
-    END AS op_std
-  FROM stock_with_master s
-  WHERE (s.yymm >= '202512' OR (s.remark_num >= 1 AND s.remark_num <= 8))
+    -- remark1~8(remark_num 1~8) 구간 + 25.12~ 구간 = 23.12 이후 전체 → 파생 키 대신 yymm으로 필터
+    -- (remark 룩업 조인 시 별칭 remark_num은 rl.remark_num 컬럼에 가려지므로 참조하지 않음)
+    AND st.yymm >= '202312'
 ),
 
--- Step 3: 주력/아울렛 판정 (판매와 동일 로직)
+-- Step 2: 주력/아울렛 판정 (판매와 동일 로직)
 stock_classified AS (
   SELECT 
     yymm,
@@ -137,41 +151,66 @@ stock_classified AS (
     stock_qty_expected,
     stock_tag_amt_total,
     -- 주력/아울렛 판정 로직
+    -- (고정값 op_std는 등호 비교로 먼저 처리하고, 정규식은 숫자+시즌 형태 op_std에만 적용)
     CASE
-      -- 1. op_std가 있으면 우선 판단
+      -- 1. op_std가 고정값이면 우선 판단
       WHEN op_std IN ('FOCUS', 'INTRO') THEN 'core'
       WHEN op_std IN ('OUTLET', 'CARE', 'DONE') THEN 'outlet'
       
-      -- 2. op_std가 숫자+시즌 형태면 연도 비교
-      WHEN op_std IS NOT NULL AND op_std NOT IN ('FOCUS', 'INTRO', 'OUTLET', 'CARE', 'DONE') THEN
-        CASE 
-          WHEN TRY_TO_NUMBER(REGEXP_SUBSTR(op_std, '\\\\d{{2}}')) >= TRY_TO_NUMBER(row_yy) THEN 'core'
-          ELSE 'outlet'
-        END
+      -- 2. op_std가 NULL이면 sesn으로 판단
+      WHEN op_std IS NULL AND sesn_yy >= row_yy_n THEN 'core'
+      WHEN op_std IS NULL THEN 'outlet'
       
-      -- 3. op_std가 NULL이면 sesn으로 판단
-      WHEN TRY_TO_NUMBER(LEFT(sesn, 2)) >= TRY_TO_NUMBER(row_yy) THEN 'core'
+      -- 3. op_std가 숫자+시즌 형태면 연도 비교
+      WHEN TRY_TO_NUMBER(REGEXP_SUBSTR(op_std, '\\\\d{{2}}')) >= row_yy_n THEN 'core'
       
       -- 4. 그 외 모두 아울렛
       ELSE 'outlet'
     END AS product_type
-  FROM stock_with_remark
+  FROM stock_with_master
+),
+
+-- Step 3: 채널 그룹 정규화 (FR → FRS, HQ/OR → HQ_OR)
+stock_normalized AS (
+  SELECT
+    yymm,
+    brd_cd,
+    prdt_kind_nm_en,
+    CASE
+      WHEN fr_or_cls = 'FR' THEN 'FRS'
+      WHEN fr_or_cls IN ('HQ', 'OR') THEN 'HQ_OR'
+    END AS channel_group,
+    product_type,
+    stock_qty_expected,
+    stock_tag_amt_total
+  FROM stock_classified
 )
 
 -- Step 4: 최종 집계
+-- GROUPING SETS로 아이템탭(전체/개별) × 채널(전체/FRS/HQ_OR) 전개까지 Snowflake에서 처리
+-- 롤업 행 판별은 GROUPING()으로 수행 (실제 NULL 값이 '전체'로 섞이지 않도록)
 SELECT 
   yymm AS month,
   brd_cd AS brand,
-  prdt_kind_nm_en AS item_category,
-  fr_or_cls AS channel,
+  CASE WHEN GROUPING(prdt_kind_nm_en) = 1 THEN '전체' ELSE prdt_kind_nm_en END AS item_tab,
+  CASE WHEN GROUPING(channel_group) = 1 THEN '전체' ELSE channel_group END AS channel,
   product_type,
   SUM(stock_tag_amt_total) AS total_amount,
   SUM(stock_qty_expected) AS total_qty
-FROM stock_classified
-GROUP BY yymm, brd_cd, prdt_kind_nm_en, fr_or_cls, product_type
-ORDER BY yymm, brd_cd, item_category, channel, product_type
+FROM stock_normalized
+GROUP BY GROUPING SETS (
+  (yymm, brd_cd, prdt_kind_nm_en, channel_group, product_type),
+  (yymm, brd_cd, channel_group, product_type),
+  (yymm, brd_cd, prdt_kind_nm_en, product_type),
+  (yymm, brd_cd, product_type)
+)
 """
-    return query
+    params = {
+        'start_month': start_month,
+        'end_month': end_month,
+        'reference_month': reference_month,
+    }
+    return query, params
 
 
 def aggregate_inventory_from_snowflake(
@@ -196,51 +235,40 @@ def aggregate_inventory_from_snowflake(
     ref = reference_month if reference_month else end_month
     print(f"[재고] Snowflake에서 데이터 조회 중... ({start_month} ~ {end_month}), 기준월(ref)={ref}")
 
-    query = build_inventory_aggregation_query(start_month, end_month, ref)
-    results = execute_query_batch(query)
+    query, params = build_inventory_aggregation_query(start_month, end_month, ref)
+    df = execute_query_pandas_cached(query, params, cache_tag=f"inventory_{start_month}_{end_month}")
     
-    print(f"[재고] 조회 완료: {len(results):,}행")
+    print(f"[재고] 조회 완료: {len(df):,}행")
     
-    # 집계 결과를 기존 형식으로 변환
-    agg_dict: Dict[Tuple, float] = defaultdict(float)
-    
-    for row in results:
-        month_yyyymm = row['MONTH']  # YYYYMM
-        month_display = f"{month_yyyymm[:4]}.{month_yyyymm[4:6]}"  # YYYY.MM
-        
-        brand_code = row['BRAND']
-        brand_name = BRAND_CODE_MAP.get(brand_code, brand_code)
-        
-        item_category = row['ITEM_CATEGORY']
-        channel = row['CHANNEL']
-        product_type = row['PRODUCT_TYPE']
-        amount = float(row['TOTAL_AMOUNT']) if row['TOTAL_AMOUNT'] else 0.0
-        qty = float(row['TOTAL_QTY']) if row['TOTAL_QTY'] else 0.0
-        
-        # 아이템탭: "전체" + 개별 카테고리
-        item_tabs = ['전체', item_category]
-        
-        for item_tab in item_tabs:
-            # 전체재고 (FR + HQ + OR)
-            key_total = (brand_name, item_tab, month_display, '전체', product_type)
-            agg_dict[key_total] += amount
-            
-            # 대리상재고 (FRS)
-            if channel == 'FR':
-                key_frs = (brand_name, item_tab, month_display, 'FRS', product_type)
-                agg_dict[key_frs] += amount
-            
-            # 본사재고 (HQ + OR)
-            if channel in ['HQ', 'OR']:
-                key_hq_or = (brand_name, item_tab, month_display, 'HQ_OR', product_type)
-                agg_dict[key_hq_or] += amount
+    # 집계 결과를 기존 형식으로 변환 (pandas 벡터 연산)
+    # (아이템탭 "전체" 및 채널 전체/FRS/HQ_OR 전개는 SQL GROUPING SETS에서 완료됨)
+    if df.empty:
+        agg_dict: Dict[Tuple, float] = {}
+    else:
+        month_yyyymm = df['MONTH'].astype(str)  # YYYYMM
+        # 고유 월(최대 수십 개)만 YYYY.MM으로 변환한 뒤 dict map (행마다 문자열 슬라이싱하지 않음)
+        month_display = {m: f"{m[:4]}.{m[4:6]}" for m in month_yyyymm.unique()}
+        frame = pd.DataFrame({
+            'brand': df['BRAND'].map(BRAND_CODE_MAP).fillna(df['BRAND']),
+            'item_tab': df['ITEM_TAB'],
+            'month': month_yyyymm.map(month_display),  # YYYY.MM
+            'channel': df['CHANNEL'],
+            'product_type': df['PRODUCT_TYPE'],
+            'amount': pd.to_numeric(df['TOTAL_AMOUNT'], errors='coerce').fillna(0.0).astype(float),
+        })
+        # 키 컬럼을 category로 바꾸고 카테고리 문자열을 intern → 같은 값은 한 객체를 공유
+        # (groupby 해싱은 고유값 단위로만, 이후 dict 키 해시도 캐시된 문자열 재사용)
+        for col in AGG_KEY_COLUMNS:
+            frame[col] = frame[col].astype('category').cat.rename_categories(sys.intern)
+        totals = frame.groupby(AGG_KEY_COLUMNS, sort=False, observed=True)['amount'].sum()
+        agg_dict = dict(zip(totals.index, totals.tolist()))
     
     print(f"[재고] 집계 완료: {len(agg_dict):,}개 키")
     
     # 예상치 못한 카테고리는 빈 set
     unexpected_categories = set()
     
-    return dict(agg_dict), unexpected_categories
+    return agg_dict, unexpected_categories
 
 
 if __name__ == "__main__":
@@ -253,7 +281,8 @@ if __name__ == "__main__":
         agg_dict, unexpected = aggregate_inventory_from_snowflake('202511', '202511')
         
         print(f"\n집계 결과 샘플 (2025.11 MLB):")
-        for key, value in list(agg_dict.items())[:10]:
+        # SQL에 ORDER BY가 없으므로 출력용으로만 정렬
+        for key, value in sorted(agg_dict.items())[:10]:
             brand, item_tab, month, channel, ptype = key
             if brand == 'MLB' and month == '2025.11':
                 print(f"  {brand} / {item_tab} / {channel} / {ptype}: {value:,.0f}")
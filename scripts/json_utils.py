@@ -0,0 +1,37 @@
+"""
+전처리 결과 JSON 저장 유틸리티
+
+orjson(C 구현)으로 직렬화하여 bytes로 바로 기록
+- OPT_INDENT_2: 기존 json.dump(..., ensure_ascii=False, indent=2)와 동일한 출력
+- OPT_SERIALIZE_NUMPY: pandas/NumPy 집계에서 넘어온 numpy 스칼라 허용
+- orjson 미설치 환경에서는 표준 json으로 같은 형식 저장
+"""
+
+import json
+from pathlib import Path
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson 없으면 표준 json 사용 (출력 형식 동일, 속도만 느림)
+    orjson = None
+
+JSON_DUMP_OPTIONS = (orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY) if orjson else None
+
+
+def _numpy_default(obj: Any) -> Any:
+    """표준 json 경로에서 numpy 스칼라를 파이썬 기본 타입으로 변환"""
+    if hasattr(obj, 'item'):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def write_json(path: Path, data: Any) -> None:
+    """data를 UTF-8 JSON(indent 2)으로 path에 저장"""
+    if orjson is None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2, default=_numpy_default)
+        return
+
+    with open(path, 'wb') as f:
+        f.write(orjson.dumps(data, option=JSON_DUMP_OPTIONS))
@@ -0,0 +1,44 @@
+"""
+주력/아울렛(operation_group) 판정 - CSV 병합(--merge) 경로용 벡터화 구현
+
+Snowflake 집계 SQL의 product_type 판정과 동일한 규칙:
+1. 운영기준(op_std)이 FOCUS/INTRO → core, OUTLET/CARE/DONE → outlet
+2. 운영기준이 없으면 시즌 YY >= 행 연도 YY → core, 아니면 outlet
+3. 운영기준이 숫자+시즌 형태면 운영기준의 YY >= 행 연도 YY → core
+4. 그 외 모두 outlet
+"""
+
+import numpy as np
+import pandas as pd
+
+CORE_OP_STANDARDS = ["FOCUS", "INTRO"]
+OUTLET_OP_STANDARDS = ["OUTLET", "CARE", "DONE"]
+
+
+def classify_operation_group(op_standard: pd.Series, season: pd.Series, row_yy: int) -> np.ndarray:
+    """
+    운영기준/시즌 컬럼으로 행 단위 core/outlet 판정 (apply(axis=1) 없이 컬럼 연산)
+
+    Args:
+        op_standard: 운영기준 컬럼 (예: "FOCUS", "24FW", NaN)
+        season: 상품 시즌 컬럼 (예: "24SS")
+        row_yy: 행 연도 YY (예: 2025.11 → 25)
+
+    Returns:
+        np.ndarray: 'core' / 'outlet' 배열
+    """
+    op_missing = op_standard.isna()
+    op_yy = pd.to_numeric(op_standard.str.extract(r"(\d{2})", expand=False), errors="coerce")
+    season_yy = pd.to_numeric(season.str[:2], errors="coerce")
+
+    return np.select(
+        [
+            op_standard.isin(CORE_OP_STANDARDS),
+            op_standard.isin(OUTLET_OP_STANDARDS),
+            op_missing & (season_yy >= row_yy),
+            op_missing,
+            op_yy >= row_yy,
+        ],
+        ["core", "outlet", "core", "outlet", "core"],
+        default="outlet",
+    )
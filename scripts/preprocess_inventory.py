@@ -7,8 +7,14 @@
 
 import json
 import calendar
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Set, Tuple, Any
+from typing import Dict, List, Set, Tuple, Any
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 
 # 프로젝트 루트로 경로 추가
 import sys
@@ -16,6 +22,9 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 from inventory_aggregation import aggregate_inventory_from_snowflake
 from sales_aggregation import aggregate_sales_from_snowflake
+from operation_group import classify_operation_group
+from json_utils import write_json
+from snowflake_utils import disable_query_cache, enable_query_cache, warehouse_size_override
 
 # ========== 설정 ==========
 OUTPUT_PATH = Path(__file__).parent.parent / "public" / "data"
@@ -31,11 +40,44 @@ ANALYSIS_MONTHS = [
 VALID_BRANDS = {"MLB", "MLB KIDS", "DISCOVERY"}
 VALID_ITEM_CATEGORIES = {"Shoes", "Headwear", "Bag", "Acc_etc"}
 
+ITEM_TABS = ["전체", "Shoes", "Headwear", "Bag", "Acc_etc"]
+
+# CSV 병합(--merge) 모드 설정
+INVENTORY_DATA_PATH = Path(r"D:\data\inventory")
+TARGET_CATEGORY = "饰品"
+INVENTORY_COLUMN_TYPES = {
+    "Channel 2": pa.string(),
+    "产品品牌": pa.string(),
+    "产品大分类": pa.string(),
+    "产品中分类": pa.string(),
+    "运营基准": pa.string(),
+    "产品季节": pa.string(),
+    "预计库存金额": pa.float64(),
+}
+INVENTORY_COLUMNS = list(INVENTORY_COLUMN_TYPES)
+# CSV Channel 2 → 재고 채널 그룹 (전체재고는 모든 채널 합)
+INVENTORY_CHANNEL_GROUPS = {"FRS": "FRS", "HQ": "HQ_OR", "OR": "HQ_OR"}
+
+# 월별 데이터 필드 (JSON 키 순서 유지) 및 0 기본값
+MONTH_FIELD_KEYS = [
+    f"{prefix}_{op}"
+    for op in ["core", "outlet"]
+    for prefix in ["전체", "FRS", "HQ_OR", "OR_sales"]
+]
+DEFAULT_ZERO_MD = dict.fromkeys(MONTH_FIELD_KEYS, 0)
+
 
 def get_days_in_month(year: int, month: int) -> int:
     return calendar.monthrange(year, month)[1]
 
 
+# ANALYSIS_MONTHS 월별 일수 (import 시 1회 계산)
+DAYS_IN_MONTH = {
+    month: get_days_in_month(int(month[:4]), int(month[5:7]))
+    for month in ANALYSIS_MONTHS
+}
+
+
 def get_processed_months_from_json() -> set:
     """
     기존 JSON 파일에서 실제로 데이터가 있는 월 목록 추출
@@ -222,30 +264,41 @@ def process_inventory_data(months_to_process: list = None, reference_month: str
         raise
 
 
+def bucket_month_fields(inv_agg: Dict, sales_or: Dict) -> Dict[Tuple[str, str, str], Dict[str, float]]:
+    """
+    집계 dict를 (brand, item_tab, month) 단위로 한 번에 묶어 월별 필드 dict로 변환
+
+    Returns:
+        Dict: (brand, item_tab, month) → {"전체_core": ..., "OR_sales_outlet": ..., ...}
+    """
+    buckets: Dict[Tuple[str, str, str], Dict[str, float]] = {}
+    for (brand, item_tab, month, channel, op), value in inv_agg.items():
+        field = f"{channel}_{op}"
+        if field in DEFAULT_ZERO_MD:
+            buckets.setdefault((brand, item_tab, month), {})[field] = round(value)
+    for (brand, item_tab, month, channel, op), value in sales_or.items():
+        if channel == "OR":
+            buckets.setdefault((brand, item_tab, month), {})[f"OR_sales_{op}"] = value
+    return buckets
+
+
 def convert_to_json(inv_agg: Dict, sales_or: Dict, unexpected: Set) -> Dict:
     result = {
         "brands": {},
         "unexpectedCategories": sorted(list(unexpected)),
         "months": ANALYSIS_MONTHS,
-        "daysInMonth": {}
+        "daysInMonth": dict(DAYS_IN_MONTH)
     }
     
-    for month in ANALYSIS_MONTHS:
-        year, month_num = int(month[:4]), int(month[5:7])
-        result["daysInMonth"][month] = get_days_in_month(year, month_num)
+    buckets = bucket_month_fields(inv_agg, sales_or)
     
     for brand in VALID_BRANDS:
         result["brands"][brand] = {}
-        for item_tab in ["전체", "Shoes", "Headwear", "Bag", "Acc_etc"]:
-            result["brands"][brand][item_tab] = {}
-            for month in ANALYSIS_MONTHS:
-                md = {}
-                for op in ["core", "outlet"]:
-                    md[f"전체_{op}"] = round(inv_agg.get((brand, item_tab, month, "전체", op), 0))
-                    md[f"FRS_{op}"] = round(inv_agg.get((brand, item_tab, month, "FRS", op), 0))
-                    md[f"HQ_OR_{op}"] = round(inv_agg.get((brand, item_tab, month, "HQ_OR", op), 0))
-                    md[f"OR_sales_{op}"] = sales_or.get((brand, item_tab, month, "OR", op), 0)
-                result["brands"][brand][item_tab][month] = md
+        for item_tab in ITEM_TABS:
+            result["brands"][brand][item_tab] = {
+                month: {**DEFAULT_ZERO_MD, **buckets.get((brand, item_tab, month), {})}
+                for month in ANALYSIS_MONTHS
+            }
     
     return result
 
@@ -312,13 +365,16 @@ def main(reference_month: str = None):
     ref_yyyymm = reference_month.replace('.', '') if reference_month else get_reference_month()
     print(f"\n[기준월] {ref_yyyymm}  ← 이 월=MST 실시간, 25.12~이전=PREP 익월")
 
-    print("\n판매 OR 데이터 로드 중 (Snowflake)...")
-    sales_or_dict = load_sales_or_data(months_to_process, reference_month=ref_yyyymm)
+    # 판매 OR / 재고 쿼리는 서로 독립적이므로 동시에 실행 (Snowflake 왕복 대기 시간 중첩)
+    # 두 작업은 snowflake_utils 공유 연결에서 각자 cursor를 열어 실행 (세션 상태를 바꾸는 쿼리 없음)
+    print("\n판매 OR / 재고 데이터 동시 조회 중 (Snowflake)...")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        sales_future = executor.submit(load_sales_or_data, months_to_process, reference_month=ref_yyyymm)
+        inventory_future = executor.submit(process_inventory_data, months_to_process, reference_month=ref_yyyymm)
+        sales_or_dict = sales_future.result()
+        inv_agg, unexpected = inventory_future.result()
     print(f"OR 판매 키 수: {len(sales_or_dict):,}")
     
-    print("\n재고 데이터 처리 중 (Snowflake)...")
-    inv_agg, unexpected = process_inventory_data(months_to_process, reference_month=ref_yyyymm)
-    
     if unexpected:
         print(f"\n[WARNING] 예상치 못한 중분류: {sorted(unexpected)}")
     
@@ -380,8 +436,7 @@ def main(reference_month: str = None):
         print("[완료] 스냅샷 데이터 병합 완료 (2025년 11월까지 고정)")
     
     # JSON 저장
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
+    write_json(output_file, result)
     
     # 완료 상태 출력
     print("\n" + "=" * 60)
@@ -417,6 +472,41 @@ def main(reference_month: str = None):
         print("[시즌차트] 신규 처리 월이 없어 자동 갱신을 건너뜁니다.")
 
 
+def aggregate_inventory_chunk(chunk: pd.DataFrame, year_month: str) -> pd.Series:
+    """
+    재고 CSV chunk를 (brand, item_tab, month, channel_group, op_group) 단위로 합산
+
+    아이템탭("전체" + 정상 중분류)과 채널(전체 + FRS/HQ_OR) 전개를 long-form concat으로
+    만든 뒤 groupby 한 번으로 집계한다 (iterrows 없이 컬럼 연산만 사용).
+
+    Args:
+        chunk: 브랜드/대분류 필터가 끝난 CSV 데이터
+        year_month: 파일 월 (YYYY.MM)
+
+    Returns:
+        pd.Series: 5-tuple MultiIndex → 금액 합계
+    """
+    base = pd.DataFrame({
+        "brand": chunk["产品品牌"].to_numpy(),
+        "item_cat": chunk["产品中分类"].to_numpy(),
+        "month": year_month,
+        "channel": chunk["Channel 2"].map(INVENTORY_CHANNEL_GROUPS).to_numpy(),
+        "op_group": classify_operation_group(chunk["运营基准"], chunk["产品季节"], int(year_month[2:4])),
+        "amount": chunk["预计库存金额"].fillna(0.0).to_numpy(),
+    })
+    
+    by_item_tab = pd.concat([
+        base.assign(item_tab="전체"),
+        base[base["item_cat"].isin(VALID_ITEM_CATEGORIES)].assign(item_tab=lambda df: df["item_cat"]),
+    ])
+    long_form = pd.concat([
+        by_item_tab.assign(channel="전체"),  # 전체재고
+        by_item_tab[by_item_tab["channel"].notna()],  # FRS / HQ_OR(본사재고)
+    ])
+    
+    return long_form.groupby(["brand", "item_tab", "month", "channel", "op_group"], sort=False)["amount"].sum()
+
+
 def merge_inventory_month(months_to_merge: list, new_inventory_path: str = None):
     """
     특정 월의 재고 데이터만 병합 (기존 JSON 유지)
@@ -450,7 +540,7 @@ def merge_inventory_month(months_to_merge: list, new_inventory_path: str = None)
     sales_or_dict = load_sales_or_data()
     
     # 3. 새 월 데이터 처리
-    agg_dict: Dict[Tuple, float] = defaultdict(float)
+    month_totals: List[pd.Series] = []
     unexpected_categories: Set[str] = set()
     
     for month in months_to_merge:
@@ -463,87 +553,54 @@ def merge_inventory_month(months_to_merge: list, new_inventory_path: str = None)
         print(f"처리 중 (재고): {file_path}")
         
         try:
-            for chunk in pd.read_csv(
+            # Arrow 멀티스레드 CSV 파서로 필요한 컬럼만 타입 지정하여 읽기 (UTF-8 BOM 자동 처리)
+            table = pacsv.read_csv(
                 file_path,
-                chunksize=CHUNK_SIZE,
-                encoding='utf-8-sig',
-                usecols=INVENTORY_COLUMNS,
-                dtype={
-                    "Channel 2": str,
-                    "产品品牌": str,
-                    "产品大分类": str,
-                    "产品中分类": str,
-                    "运营基准": str,
-                    "产品季节": str,
-                    "预计库存金额": float
-                }
-            ):
-                # 브랜드 필터
-                chunk = chunk[chunk["产品品牌"].isin(VALID_BRANDS)]
-                if chunk.empty:
-                    continue
-                
-                # 대분류 필터
-                chunk = chunk[chunk["产品大分类"] == TARGET_CATEGORY]
-                if chunk.empty:
-                    continue
-                
-                # 예상치 못한 중분류 확인
-                chunk_categories = set(chunk["产品中分类"].dropna().unique())
-                for cat in chunk_categories:
-                    if cat not in VALID_ITEM_CATEGORIES:
-                        unexpected_categories.add(cat)
-                
-                # operation_group 파생
-                chunk["operation_group"] = chunk.apply(
-                    lambda row: determine_operation_group(row["运营基准"], row["产品季节"]), 
-                    axis=1
-                )
-                
-                # 연월 추출
-                year = month[:4]
-                month_num = month[5:7]
-                year_month = f"{year}.{month_num}"
-                
-                # 집계
-                for _, row in chunk.iterrows():
-                    brand = row["产品品牌"]
-                    item_cat = row["产品中分类"]
-                    channel = row["Channel 2"]
-                    op_group = row["operation_group"]
-                    amount = row["预计库存金额"] if pd.notna(row["预计库存金额"]) else 0.0
-                    
-                    if item_cat in VALID_ITEM_CATEGORIES:
-                        item_tabs = ["전체", item_cat]
-                    else:
-                        item_tabs = ["전체"]
-                    
-                    for item_tab in item_tabs:
-                        # 전체재고
-                        key_total = (brand, item_tab, year_month, "전체", op_group)
-                        agg_dict[key_total] += amount
-                        
-                        # 채널별 재고
-                        if channel == "FRS":
-                            key_frs = (brand, item_tab, year_month, "FRS", op_group)
-                            agg_dict[key_frs] += amount
-                        elif channel in ["HQ", "OR"]:  # HQ + OR = 본사재고
-                            key_hq_or = (brand, item_tab, year_month, "HQ_OR", op_group)
-                            agg_dict[key_hq_or] += amount
+                read_options=pacsv.ReadOptions(use_threads=True),
+                convert_options=pacsv.ConvertOptions(
+                    include_columns=INVENTORY_COLUMNS,
+                    column_types=INVENTORY_COLUMN_TYPES,
+                    strings_can_be_null=True,  # 빈 문자열 → NULL (pd.read_csv와 동일)
+                ),
+            )
+            
+            # 브랜드 / 대분류 필터 (Arrow compute에서 처리 후 pandas 변환)
+            table = table.filter(pc.and_(
+                pc.is_in(table["产品品牌"], value_set=pa.array(sorted(VALID_BRANDS))),
+                pc.equal(table["产品大分类"], TARGET_CATEGORY),
+            ))
+            if table.num_rows == 0:
+                continue
+            frame = table.to_pandas()
+            
+            # 예상치 못한 중분류 확인
+            file_categories = set(frame["产品中分类"].dropna().unique())
+            for cat in file_categories:
+                if cat not in VALID_ITEM_CATEGORIES:
+                    unexpected_categories.add(cat)
+            
+            # 집계 (벡터화 groupby) - 월별 결과는 모아 두었다가 한 번에 합산
+            month_totals.append(aggregate_inventory_chunk(frame, month))
                         
         except Exception as e:
             print(f"[ERROR] 파일 처리 실패: {file_path}")
             print(f"  - {e}")
     
+    if month_totals:
+        totals = pd.concat(month_totals).groupby(level=[0, 1, 2, 3, 4], sort=False).sum()
+        agg_dict: Dict[Tuple, float] = dict(zip(totals.index, totals.tolist()))
+    else:
+        agg_dict = {}
+    
     # 4. 기존 데이터에 병합
     print()
     print("기존 데이터에 병합 중...")
     
+    buckets = bucket_month_fields(agg_dict, sales_or_dict)
+    
     for month in months_to_merge:
-        year, month_num = int(month[:4]), int(month[5:7])
-        
-        # daysInMonth 업데이트
-        existing_data["daysInMonth"][month] = get_days_in_month(year, month_num)
+        # daysInMonth 업데이트 (ANALYSIS_MONTHS 밖의 월만 직접 계산)
+        existing_data["daysInMonth"][month] = DAYS_IN_MONTH.get(month) or get_days_in_month(int(month[:4]), int(month[5:7]))
         
         # 브랜드별 데이터 업데이트
         for brand in VALID_BRANDS:
@@ -552,19 +609,14 @@ def merge_inventory_month(months_to_merge: list, new_inventory_path: str = None)
             if brand_key not in existing_data["brands"]:
                 existing_data["brands"][brand_key] = {}
             
-            for item_tab in ["전체", "Shoes", "Headwear", "Bag", "Acc_etc"]:
+            for item_tab in ITEM_TABS:
                 if item_tab not in existing_data["brands"][brand_key]:
                     existing_data["brands"][brand_key][item_tab] = {}
                 
                 # 해당 월 데이터 생성
-                md = {}
-                for op in ["core", "outlet"]:
-                    md[f"전체_{op}"] = round(agg_dict.get((brand, item_tab, month, "전체", op), 0))
-                    md[f"FRS_{op}"] = round(agg_dict.get((brand, item_tab, month, "FRS", op), 0))
-                    md[f"HQ_OR_{op}"] = round(agg_dict.get((brand, item_tab, month, "HQ_OR", op), 0))
-                    md[f"OR_sales_{op}"] = sales_or_dict.get((brand, item_tab, month, "OR", op), 0)
-                
-                existing_data["brands"][brand_key][item_tab][month] = md
+                existing_data["brands"][brand_key][item_tab][month] = {
+                    **DEFAULT_ZERO_MD, **buckets.get((brand, item_tab, month), {})
+                }
     
     # months 목록 업데이트
     for month in months_to_merge:
@@ -573,8 +625,7 @@ def merge_inventory_month(months_to_merge: list, new_inventory_path: str = None)
     existing_data["months"] = sorted(existing_data["months"])
     
     # 5. JSON 저장
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(existing_data, f, ensure_ascii=False, indent=2)
+    write_json(output_file, existing_data)
     
     print(f"[DONE] 병합 완료: {output_file}")
     print(f"병합된 월: {months_to_merge}")
@@ -586,6 +637,15 @@ def merge_inventory_month(months_to_merge: list, new_inventory_path: str = None)
 if __name__ == "__main__":
     import sys
     
+    # 캐시 사용: python preprocess_inventory.py --cache [...] → TTL 내 동일 쿼리는 scripts/.cache 결과 재사용 (기본은 항상 재조회)
+    # 캐시 무시: python preprocess_inventory.py --no-cache [...] → .env.local에 SNOWFLAKE_QUERY_CACHE=1이어도 재조회
+    if "--cache" in sys.argv:
+        sys.argv.remove("--cache")
+        enable_query_cache()
+    if "--no-cache" in sys.argv:
+        sys.argv.remove("--no-cache")
+        disable_query_cache()
+    
     # 병합 모드: python preprocess_inventory.py --merge 2025.11
     if len(sys.argv) > 1 and sys.argv[1] == "--merge":
         months = sys.argv[2:]
@@ -598,11 +658,13 @@ if __name__ == "__main__":
     elif len(sys.argv) > 1 and sys.argv[1] == "--reference-month":
         if len(sys.argv) > 2:
             reference_month = sys.argv[2]
-            main(reference_month=reference_month)
+            with warehouse_size_override():
+                main(reference_month=reference_month)
         else:
             print("사용법: python preprocess_inventory.py --reference-month 2026.01")
     else:
-        main()
+        with warehouse_size_override():
+            main()
 
 
 
@@ -8,13 +8,21 @@
 import json
 import os
 from pathlib import Path
-from typing import Dict, Set, Tuple, Any
+from typing import Dict, List, Set, Tuple, Any
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 
 # 프로젝트 루트로 경로 추가 (sales_aggregation 임포트용)
 import sys
 sys.path.insert(0, str(Path(__file__).parent))
 
 from sales_aggregation import aggregate_sales_from_snowflake
+from snowflake_utils import disable_query_cache, enable_query_cache, warehouse_size_override
+from json_utils import write_json
+from operation_group import classify_operation_group
 
 # ========== 설정 ==========
 OUTPUT_PATH = Path(__file__).parent.parent / "public" / "data"
@@ -29,10 +37,39 @@ ANALYSIS_MONTHS = [
 ]
 
 # 브랜드 필터
-VALID_BRANDS = {"MLB", "MLB KIDS", "DISCOVERY"}
+VALID_BRANDS = frozenset({"MLB", "MLB KIDS", "DISCOVERY"})
 
 # 정상 중분류 값 (검증용)
-VALID_ITEM_CATEGORIES = {"Shoes", "Headwear", "Bag", "Acc_etc"}
+VALID_ITEM_CATEGORIES = frozenset({"Shoes", "Headwear", "Bag", "Acc_etc"})
+
+ITEM_TABS = ["전체", "Shoes", "Headwear", "Bag", "Acc_etc"]
+
+# 월별 데이터 필드 (JSON 키 순서 유지) 및 0 기본값
+MONTH_FIELD_KEYS = [
+    f"{channel_group}_{op}"
+    for channel_group in ["전체", "FRS", "OR"]
+    for op in ["core", "outlet"]
+]
+DEFAULT_ZERO_MD = dict.fromkeys(MONTH_FIELD_KEYS, 0)
+
+# CSV 병합(--merge) 모드 설정
+RETAIL_DATA_PATH = Path(r"D:\data\retail")
+TARGET_CATEGORY = "饰品"
+RETAIL_COLUMN_TYPES = {
+    "Channel 2": pa.string(),
+    "产品品牌": pa.string(),
+    "产品大分类": pa.string(),
+    "产品中分类": pa.string(),
+    "运营基准": pa.string(),
+    "产品季节": pa.string(),
+    "吊牌金额": pa.float64(),
+}
+RETAIL_COLUMNS = list(RETAIL_COLUMN_TYPES)
+# 필터/isin()에 매번 set → 배열 변환이 일어나지 않도록 미리 만든 값 목록
+VALID_BRAND_VALUES = pa.array(sorted(VALID_BRANDS))
+VALID_ITEM_CATEGORY_VALUES = tuple(sorted(VALID_ITEM_CATEGORIES))
+# 판매 채널 (FRS/OR 외 채널은 집계 제외)
+SALES_CHANNELS = ("FRS", "OR")
 
 
 def get_processed_months_from_json() -> set:
@@ -185,9 +222,26 @@ def process_retail_data(months_to_process: list = None, reference_month: str = N
         raise
 
 
+def bucket_month_fields(agg_dict: Dict[Tuple, float]) -> Dict[Tuple[str, str, str], Dict[str, int]]:
+    """
+    판매 집계 dict를 (brand, item_tab, month) 단위로 한 번에 묶어 월별 필드 dict로 변환
+
+    Returns:
+        Dict: (brand, item_tab, month) → {"전체_core": ..., "OR_outlet": ..., ...} (원 단위 반올림)
+    """
+    buckets: Dict[Tuple[str, str, str], Dict[str, int]] = {}
+    for (brand, item_tab, month, channel_group, op_group), amount in agg_dict.items():
+        field = f"{channel_group}_{op_group}"
+        if field in DEFAULT_ZERO_MD:
+            buckets.setdefault((brand, item_tab, month), {})[field] = round(amount)
+    return buckets
+
+
 def convert_sales_to_json_structure(agg_dict: Dict[Tuple, float], unexpected_categories: Set[str]) -> Dict[str, Any]:
     """
     판매 집계 결과를 JSON 구조로 변환
+
+    agg_dict를 한 번 순회해 월별 필드를 묶은 뒤, 값이 없는 필드는 0으로 채운다.
     """
     result = {
         "brands": {},
@@ -195,24 +249,16 @@ def convert_sales_to_json_structure(agg_dict: Dict[Tuple, float], unexpected_cat
         "months": ANALYSIS_MONTHS
     }
     
+    buckets = bucket_month_fields(agg_dict)
+    
     for brand in VALID_BRANDS:
         result["brands"][brand] = {}
-        
-        for item_tab in ["전체", "Shoes", "Headwear", "Bag", "Acc_etc"]:
-            result["brands"][brand][item_tab] = {}
-            
-            for month in ANALYSIS_MONTHS:
-                month_data = {}
-                
-                for channel_group in ["전체", "FRS", "OR"]:
-                    for op_group in ["core", "outlet"]:
-                        key = (brand, item_tab, month, channel_group, op_group)
-                        amount = agg_dict.get(key, 0.0)
-                        # 원 단위로 저장 (나누기 제거)
-                        amount_won = round(amount)
-                        month_data[f"{channel_group}_{op_group}"] = amount_won
-                
-                result["brands"][brand][item_tab][month] = month_data
+        for item_tab in ITEM_TABS:
+            # 원 단위로 저장 (나누기 제거)
+            result["brands"][brand][item_tab] = {
+                month: {**DEFAULT_ZERO_MD, **buckets.get((brand, item_tab, month), {})}
+                for month in ANALYSIS_MONTHS
+            }
     
     return result
 
@@ -341,8 +387,7 @@ def main(reference_month: str = None):
         print("[완료] 스냅샷 데이터 병합 완료 (2025년 11월까지 고정)")
     
     # JSON 저장
-    with open(sales_output_file, 'w', encoding='utf-8') as f:
-        json.dump(sales_json, f, ensure_ascii=False, indent=2)
+    write_json(sales_output_file, sales_json)
     
     # 완료 상태 출력
     print("\n" + "=" * 60)
@@ -364,6 +409,42 @@ def main(reference_month: str = None):
     print()
 
 
+def aggregate_sales_chunk(chunk: pd.DataFrame, year_month: str) -> pd.Series:
+    """
+    판매 CSV chunk를 (brand, item_tab, month, channel, op_group) 단위로 합산
+
+    FRS/OR 채널만 남긴 뒤 아이템탭("전체" + 정상 중분류)과 채널(전체 + FRS/OR) 전개를
+    long-form concat으로 만들고 groupby 한 번으로 집계한다 (apply/iterrows 없이 컬럼 연산만 사용).
+
+    Args:
+        chunk: 브랜드/대분류 필터가 끝난 CSV 데이터
+        year_month: 파일 월 (YYYY.MM)
+
+    Returns:
+        pd.Series: 5-tuple MultiIndex → 금액 합계
+    """
+    chunk = chunk[chunk["Channel 2"].isin(SALES_CHANNELS)]
+    base = pd.DataFrame({
+        "brand": chunk["产品品牌"].to_numpy(),
+        "item_cat": chunk["产品中分类"].to_numpy(),
+        "month": year_month,
+        "channel": chunk["Channel 2"].to_numpy(),
+        "op_group": classify_operation_group(chunk["运营基准"], chunk["产品季节"], int(year_month[2:4])),
+        "amount": chunk["吊牌金额"].fillna(0.0).to_numpy(),
+    })
+    
+    by_item_tab = pd.concat([
+        base.assign(item_tab="전체"),
+        base[base["item_cat"].isin(VALID_ITEM_CATEGORY_VALUES)].assign(item_tab=lambda df: df["item_cat"]),
+    ])
+    long_form = pd.concat([
+        by_item_tab.assign(channel="전체"),  # 전체판매 (FRS + OR)
+        by_item_tab,  # 채널별 판매
+    ])
+    
+    return long_form.groupby(["brand", "item_tab", "month", "channel", "op_group"], sort=False)["amount"].sum()
+
+
 def merge_sales_month(months_to_merge: list, new_retail_path: str = None):
     """
     특정 월의 판매 데이터만 병합 (기존 JSON 유지)
@@ -395,7 +476,7 @@ def merge_sales_month(months_to_merge: list, new_retail_path: str = None):
     print(f"기존 JSON 로드 완료: {sales_output_file}")
     
     # 2. 새 월 데이터 처리
-    agg_dict: Dict[Tuple, float] = defaultdict(float)
+    month_totals: List[pd.Series] = []
     unexpected_categories: Set[str] = set()
     
     for month in months_to_merge:
@@ -408,75 +489,43 @@ def merge_sales_month(months_to_merge: list, new_retail_path: str = None):
         print(f"처리 중 (판매): {file_path}")
         
         try:
-            for chunk in pd.read_csv(
+            # Arrow 멀티스레드 CSV 파서로 필요한 컬럼만 타입 지정하여 읽기 (UTF-8 BOM 자동 처리)
+            table = pacsv.read_csv(
                 file_path,
-                chunksize=CHUNK_SIZE,
-                encoding='utf-8',
-                usecols=RETAIL_COLUMNS,
-                dtype={
-                    "Channel 2": str,
-                    "产品品牌": str,
-                    "产品大分类": str,
-                    "产品中分类": str,
-                    "运营基准": str,
-                    "产品季节": str,
-                    "吊牌金额": float
-                }
-            ):
-                # 브랜드 필터
-                chunk = chunk[chunk["产品品牌"].isin(VALID_BRANDS)]
-                if chunk.empty:
-                    continue
-                
-                # 대분류 필터
-                chunk = chunk[chunk["产品大分类"] == TARGET_CATEGORY]
-                if chunk.empty:
-                    continue
-                
-                # 예상치 못한 중분류 확인
-                chunk_categories = set(chunk["产品中分类"].dropna().unique())
-                for cat in chunk_categories:
-                    if cat not in VALID_ITEM_CATEGORIES:
-                        unexpected_categories.add(cat)
-                
-                # operation_group 파생
-                chunk["operation_group"] = chunk.apply(
-                    lambda row: determine_operation_group(row["运营基准"], row["产品季节"]), 
-                    axis=1
-                )
-                
-                # 연월 추출
-                year = month[:4]
-                month_num = month[5:7]
-                year_month = f"{year}.{month_num}"
-                
-                # 집계
-                for _, row in chunk.iterrows():
-                    brand = row["产品品牌"]
-                    item_cat = row["产品中分类"]
-                    channel = row["Channel 2"]
-                    op_group = row["operation_group"]
-                    amount = row["吊牌金额"] if pd.notna(row["吊牌金额"]) else 0.0
-                    
-                    if channel not in ["FRS", "OR"]:
-                        continue
-                    
-                    if item_cat in VALID_ITEM_CATEGORIES:
-                        item_tabs = ["전체", item_cat]
-                    else:
-                        item_tabs = ["전체"]
-                    
-                    for item_tab in item_tabs:
-                        key_total = (brand, item_tab, year_month, "전체", op_group)
-                        agg_dict[key_total] += amount
-                        
-                        key_channel = (brand, item_tab, year_month, channel, op_group)
-                        agg_dict[key_channel] += amount
+                read_options=pacsv.ReadOptions(use_threads=True),
+                convert_options=pacsv.ConvertOptions(
+                    include_columns=RETAIL_COLUMNS,
+                    column_types=RETAIL_COLUMN_TYPES,
+                    strings_can_be_null=True,  # 빈 문자열 → NULL (pd.read_csv와 동일)
+                ),
+            )
+            
+            # 브랜드 / 대분류 필터 (Arrow compute에서 처리 후 pandas 변환)
+            table = table.filter(pc.and_(
+                pc.is_in(table["产品品牌"], value_set=VALID_BRAND_VALUES),
+                pc.equal(table["产品大分类"], TARGET_CATEGORY),
+            ))
+            if table.num_rows == 0:
+                continue
+            frame = table.to_pandas()
+            
+            # 예상치 못한 중분류 확인
+            file_categories = set(frame["产品中分类"].dropna().unique())
+            unexpected_categories.update(file_categories - VALID_ITEM_CATEGORIES)
+            
+            # 집계 (벡터화 groupby) - 월별 결과는 모아 두었다가 한 번에 합산
+            month_totals.append(aggregate_sales_chunk(frame, month))
                         
         except Exception as e:
             print(f"[ERROR] 파일 처리 실패: {file_path}")
             print(f"  - {e}")
     
+    if month_totals:
+        totals = pd.concat(month_totals).groupby(level=[0, 1, 2, 3, 4], sort=False).sum()
+        agg_dict: Dict[Tuple, float] = dict(zip(totals.index, totals.tolist()))
+    else:
+        agg_dict = {}
+    
     # 3. 기존 데이터에 병합
     print()
     print("기존 데이터에 병합 중...")
@@ -516,8 +565,7 @@ def merge_sales_month(months_to_merge: list, new_retail_path: str = None):
     existing_data["months"] = sorted(existing_data["months"])
     
     # 4. JSON 저장
-    with open(sales_output_file, 'w', encoding='utf-8') as f:
-        json.dump(existing_data, f, ensure_ascii=False, indent=2)
+    write_json(sales_output_file, existing_data)
     
     print(f"[DONE] 병합 완료: {sales_output_file}")
     print(f"병합된 월: {months_to_merge}")
@@ -529,6 +577,15 @@ def merge_sales_month(months_to_merge: list, new_retail_path: str = None):
 if __name__ == "__main__":
     import sys
     
+    # 캐시 사용: python preprocess_sales.py --cache [...] → TTL 내 동일 쿼리는 scripts/.cache 결과 재사용 (기본은 항상 재조회)
+    # 캐시 무시: python preprocess_sales.py --no-cache [...] → .env.local에 SNOWFLAKE_QUERY_CACHE=1이어도 재조회
+    if "--cache" in sys.argv:
+        sys.argv.remove("--cache")
+        enable_query_cache()
+    if "--no-cache" in sys.argv:
+        sys.argv.remove("--no-cache")
+        disable_query_cache()
+    
     # 병합 모드: python preprocess_sales.py --merge 2025.11
     if len(sys.argv) > 1 and sys.argv[1] == "--merge":
         months = sys.argv[2:]
@@ -541,8 +598,10 @@ if __name__ == "__main__":
     elif len(sys.argv) > 1 and sys.argv[1] == "--reference-month":
         if len(sys.argv) > 2:
             reference_month = sys.argv[2]
-            main(reference_month=reference_month)
+            with warehouse_size_override():
+                main(reference_month=reference_month)
         else:
             print("사용법: python preprocess_sales.py --reference-month 2026.01")
     else:
-        main()
+        with warehouse_size_override():
+            main()
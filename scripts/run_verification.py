@@ -15,46 +15,62 @@ if sys.platform == 'win32':
 
 # 상위 디렉토리의 snowflake_utils 사용
 sys.path.append(os.path.dirname(__file__))
-from snowflake_utils import execute_query_batch
+import snowflake.connector
+from snowflake_utils import get_snowflake_connection
 
 # .env.local 로드
 load_dotenv(override=True)
 
+# 세 검증 쿼리가 공유하는 shop_map_norm을 세션 임시 테이블로 한 번만 생성
+CREATE_SHOP_MAP_NORM_SQL = """
+CREATE TEMPORARY TABLE shop_map_norm AS
+SELECT 
+  TO_VARCHAR(oa_map_shop_id) AS norm_key,
+  fr_or_cls
+FROM CHN.DW_SHOP_WH_DETAIL
+WHERE fr_or_cls IS NOT NULL
+  AND oa_map_shop_id IS NOT NULL
+QUALIFY ROW_NUMBER() OVER(
+  PARTITION BY oa_map_shop_id 
+  ORDER BY open_dt DESC NULLS LAST
+) = 1
+"""
+
+def run_query(cursor, query):
+    """검증 세션 커서로 쿼리 실행 후 전체 결과 반환"""
+    cursor.execute(query)
+    return cursor.fetchall()
+
 def print_section(title):
     """섹션 구분선 출력"""
     print("\n" + "="*80)
     print(f"  {title}")
     print("="*80)
 
-def run_verification_query_7():
+def run_verification_query_7(cursor):
     """
     검증 쿼리 7: 2025.11 MLB 판매 검증 (목표값 대조)
     """
     query = """
-WITH shop_map_norm AS (
-  SELECT 
-    TO_VARCHAR(oa_map_shop_id) AS norm_key,
-    fr_or_cls
-  FROM CHN.DW_SHOP_WH_DETAIL
-  WHERE fr_or_cls IS NOT NULL
-    AND oa_map_shop_id IS NOT NULL
-  QUALIFY ROW_NUMBER() OVER(
-    PARTITION BY oa_map_shop_id 
-    ORDER BY open_dt DESC NULLS LAST
-  ) = 1
+WITH scs_acc AS (
+  -- ACC 상품코드만 먼저 추려 판매와 조인 (작은 쪽을 hash build로 사용)
+  SELECT prdt_scs_cd
+  FROM FNF.CHN.MST_PRDT_SCS
+  WHERE parent_prdt_kind_cd = 'A'
+    AND prdt_kind_nm_en IN ('Shoes', 'Headwear', 'Bag', 'Acc_etc')
 ),
 sales_202511 AS (
   SELECT 
     sm.fr_or_cls,
     SUM(s.tag_amt) AS total_amt
   FROM CHN.DW_SALE s
-  INNER JOIN FNF.CHN.MST_PRDT_SCS p ON s.prdt_scs_cd = p.prdt_scs_cd
-  LEFT JOIN shop_map_norm sm ON TO_VARCHAR(s.shop_id) = sm.norm_key
-  WHERE TO_CHAR(s.sale_dt, 'YYYYMM') = '202511'
-    AND s.brd_cd = 'M'
-    AND p.parent_prdt_kind_cd = 'A'
-    AND p.prdt_kind_nm_en IN ('Shoes', 'Headwear', 'Bag', 'Acc_etc')
+  INNER JOIN scs_acc p ON s.prdt_scs_cd = p.prdt_scs_cd
+  INNER JOIN shop_map_norm sm
+    ON TO_VARCHAR(s.shop_id) = sm.norm_key
     AND sm.fr_or_cls IN ('FR', 'OR')
+  WHERE s.sale_dt >= DATE '2025-11-01'
+    AND s.sale_dt < DATE '2025-12-01'
+    AND s.brd_cd = 'M'
   GROUP BY sm.fr_or_cls
 )
 SELECT 
@@ -92,7 +108,7 @@ ORDER BY channel
     print("\n실행 중...")
     
     try:
-        results = execute_query_batch(query)
+        results = run_query(cursor, query)
         
         print("\n결과:")
         print(f"{'채널':<10} {'실제금액':>15} {'목표금액':>15} {'차이':>15} {'달성률(%)':>12}")
@@ -134,23 +150,11 @@ ORDER BY channel
         import traceback
         traceback.print_exc()
 
-def run_quick_stats():
+def run_quick_stats(cursor):
     """
     빠른 통계 확인
     """
     query = """
-WITH shop_map_norm AS (
-  SELECT 
-    TO_VARCHAR(oa_map_shop_id) AS norm_key,
-    fr_or_cls
-  FROM CHN.DW_SHOP_WH_DETAIL
-  WHERE fr_or_cls IS NOT NULL
-    AND oa_map_shop_id IS NOT NULL
-  QUALIFY ROW_NUMBER() OVER(
-    PARTITION BY oa_map_shop_id 
-    ORDER BY open_dt DESC NULLS LAST
-  ) = 1
-)
 SELECT 
   COUNT(DISTINCT norm_key) AS unique_norm_keys,
   COUNT(DISTINCT fr_or_cls) AS unique_channels
@@ -160,7 +164,7 @@ FROM shop_map_norm
     print_section("빠른 통계: shop_map_norm")
     
     try:
-        results = execute_query_batch(query)
+        results = run_query(cursor, query)
         if results:
             row = results[0]
             print(f"\n  고유 norm_key 개수: {row.get('UNIQUE_NORM_KEYS', 0):,}")
@@ -168,23 +172,11 @@ FROM shop_map_norm
     except Exception as e:
         print(f"\n[ERROR] 오류 발생: {e}")
 
-def run_unmapped_check():
+def run_unmapped_check(cursor):
     """
     미매핑 shop_id 확인
     """
     query = """
-WITH shop_map_norm AS (
-  SELECT 
-    TO_VARCHAR(oa_map_shop_id) AS norm_key,
-    fr_or_cls
-  FROM CHN.DW_SHOP_WH_DETAIL
-  WHERE fr_or_cls IS NOT NULL
-    AND oa_map_shop_id IS NOT NULL
-  QUALIFY ROW_NUMBER() OVER(
-    PARTITION BY oa_map_shop_id 
-    ORDER BY open_dt DESC NULLS LAST
-  ) = 1
-)
 SELECT 
   TO_VARCHAR(s.shop_id) AS unmapped_shop_id,
   s.brd_cd,
@@ -192,8 +184,8 @@ SELECT
   ROUND(SUM(s.tag_amt), 0) AS total_amount
 FROM CHN.DW_SALE s
 LEFT JOIN shop_map_norm sm ON TO_VARCHAR(s.shop_id) = sm.norm_key
-WHERE s.sale_dt >= '2024-01-01'
-  AND s.sale_dt < '2025-12-01'
+WHERE s.sale_dt >= DATE '2024-01-01'
+  AND s.sale_dt < DATE '2025-12-01'
   AND s.brd_cd IN ('M', 'I', 'X')
   AND sm.fr_or_cls IS NULL
 GROUP BY s.shop_id, s.brd_cd
@@ -204,7 +196,7 @@ LIMIT 10
     print_section("미매핑 shop_id TOP 10 (판매 기준)")
     
     try:
-        results = execute_query_batch(query)
+        results = run_query(cursor, query)
         
         if not results:
             print("\n  [OK] 미매핑 shop_id가 없습니다!")
@@ -231,14 +223,24 @@ if __name__ == "__main__":
     print("  Snowflake shop_id 매핑 검증")
     print("="*80)
     
-    # 1. 빠른 통계
-    run_quick_stats()
-    
-    # 2. 미매핑 확인
-    run_unmapped_check()
-    
-    # 3. 메인 검증 (2025.11 MLB)
-    run_verification_query_7()
+    # 하나의 연결/세션에서 shop_map_norm 임시 테이블을 만들고 세 검증 쿼리가 재사용
+    conn = get_snowflake_connection()
+    try:
+        cursor = conn.cursor(snowflake.connector.DictCursor)
+        cursor.execute(CREATE_SHOP_MAP_NORM_SQL)
+        
+        # 1. 빠른 통계
+        run_quick_stats(cursor)
+        
+        # 2. 미매핑 확인
+        run_unmapped_check(cursor)
+        
+        # 3. 메인 검증 (2025.11 MLB)
+        run_verification_query_7(cursor)
+        
+        cursor.close()
+    finally:
+        conn.close()
     
     print("\n" + "="*80)
     print("  검증 완료")
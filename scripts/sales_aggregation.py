@@ -7,9 +7,13 @@
 - 브랜드: M=MLB, I=MLB KIDS, X=DISCOVERY
 """
 
-from typing import Dict, Tuple, Any, Set
-from collections import defaultdict
-from snowflake_utils import execute_query_batch
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Any, Set
+import numpy as np
+import pandas as pd
+from snowflake_utils import execute_query_pandas_batches, execute_query_pandas_cached, is_query_cache_enabled
 
 
 # 브랜드 코드 매핑
@@ -30,14 +34,62 @@ ITEM_CATEGORY_MAP = {
     'Acc_etc': 'Acc_etc'
 }
 
+# 판매 매장 키 → fr_or_cls 매핑 (SNOWFLAKE_SHOP_MAP_TABLE 미설정 시 쿼리마다 인라인 계산)
+SHOP_CLS_MAP_CTES = """-- 매장 키 → fr_or_cls 매핑 (판매 shop_id가 norm → cn → internal 순서로 처음 매칭되는 값)
+-- DW_SHOP_WH_DETAIL을 한 번 읽어 세 키를 우선순위와 함께 펼친 뒤 키별 1행만 남김
+-- → DW_SALE 쪽은 3-way LEFT JOIN + COALESCE 대신 단일 조인
+shop_detail AS (
+  SELECT shop_id, oa_shop_id, oa_map_shop_id, fr_or_cls, open_dt
+  FROM CHN.DW_SHOP_WH_DETAIL
+  WHERE fr_or_cls IS NOT NULL
+),
+shop_cls_map AS (
+  SELECT map_key, fr_or_cls
+  FROM (
+    SELECT TO_VARCHAR(oa_map_shop_id) AS map_key, 1 AS priority, fr_or_cls, open_dt
+    FROM shop_detail WHERE oa_map_shop_id IS NOT NULL
+    UNION ALL
+    SELECT TO_VARCHAR(oa_shop_id) AS map_key, 2 AS priority, fr_or_cls, open_dt
+    FROM shop_detail WHERE oa_shop_id IS NOT NULL
+    UNION ALL
+    SELECT TO_VARCHAR(shop_id) AS map_key, 3 AS priority, fr_or_cls, open_dt
+    FROM shop_detail WHERE shop_id IS NOT NULL
+  )
+  QUALIFY ROW_NUMBER() OVER(
+    PARTITION BY map_key
+    ORDER BY priority, open_dt DESC NULLS LAST
+  ) = 1
+)"""
+
+# MST_PRDT_SCS 분기 remark 컬럼 수 (remark1~8: 24.01~25.11)
+REMARK_COUNT = 8
+
+# 분기 remark 세로형 룩업 테이블 (create_prdt_remark_long.sql로 생성, 미설정 시 remark1~8 배열 인덱스 선택)
+REMARK_LONG_TABLE_ENV = 'SNOWFLAKE_REMARK_LONG_TABLE'
+
+# 마감월 사전 집계 테이블 (create_sales_classified_agg.sql로 생성, 미설정 시 전체 기간 원천 계산)
+SALES_AGG_TABLE_ENV = 'SNOWFLAKE_SALES_AGG_TABLE'
+
+# 월별 병렬 조회 동시 쿼리 수 (미설정/1이면 전체 기간 단일 쿼리)
+SALES_MONTH_WORKERS_ENV = 'SNOWFLAKE_SALES_MONTH_WORKERS'
+
+# agg_dict 키 구성 순서: (brand, item_tab, month, channel, product_type)
+AGG_KEY_COLUMNS = ['brand', 'item_tab', 'month', 'channel', 'product_type']
+
+
+def _remark_num(yyyymm: str) -> int:
+    """YYYYMM → remark 번호 (23.12 기준 3개월 단위, SQL의 remark_num 계산식과 동일)"""
+    year, month = int(yyyymm[:4]), int(yyyymm[4:6])
+    return ((year - 2023) * 12 + month - 12) // 3 + 1
+
 
 def build_sales_aggregation_query(
     start_month: str = '202401',
     end_month: str = '202511',
     reference_month: str = '202603'
-) -> str:
+) -> Tuple[str, Dict[str, str]]:
     """
-    판매 집계 SQL 쿼리 생성
+    판매 집계 SQL 쿼리 + 바인드 파라미터 생성
 
     Args:
         start_month: 시작월 (YYYYMM)
@@ -45,7 +97,7 @@ def build_sales_aggregation_query(
         reference_month: 기준월 (YYYYMM). 이 월은 MST 실시간, 이전 25.12~는 HST 익월 스냅샷 사용.
 
     Returns:
-        str: 실행할 SQL 쿼리
+        Tuple[str, Dict]: 실행할 SQL 쿼리 (월 값은 %(name)s 바인드 변수), 바인드 파라미터
 
     Note:
         operate_standard 소스 규칙:
@@ -53,7 +105,82 @@ def build_sales_aggregation_query(
         - 25.12 <= 판매월 < reference_month → HST_PRDT_SCS.operate_standard 익월 (판매월+1)
           (구 PREP_MST_PRDT_SCS 폐지, HST_PRDT_SCS로 이관됨 - 스키마 동일)
         - 24.01 ~ 25.11 → remark1~8 (분기별 고정)
+
+        SNOWFLAKE_SALES_AGG_TABLE(create_sales_classified_agg.sql로 생성한 테이블)이 설정되면
+        기준월 이전(마감월)은 사전 집계 테이블에서 읽고, 기준월 이후만 DW_SALE 원천에서 판정한다.
+        테이블은 일 1회 TASK 갱신이므로 적재된 마지막 월(MAX(sale_ym)) 이후는 기준월 이전이라도
+        원천에서 판정한다 (월초 TASK 갱신 전 직전 월 누락 방지).
+
+        SNOWFLAKE_REMARK_LONG_TABLE(create_prdt_remark_long.sql로 생성)이 설정되면
+        remark1~8은 (prdt_scs_cd, remark_num) 룩업 한 칸만 조인한다.
+
+        매장 키 매핑은 SNOWFLAKE_SHOP_MAP_TABLE(create_shop_cls_map.sql로 생성한 일 1회 갱신 테이블)이
+        설정되어 있으면 그 테이블을 조인하고, 없으면 DW_SHOP_WH_DETAIL에서 인라인으로 계산한다.
     """
+    shop_map_table = os.getenv('SNOWFLAKE_SHOP_MAP_TABLE')
+    if shop_map_table:
+        shop_cls_map_ctes = f"""-- 매장 키 → fr_or_cls 매핑 (create_shop_cls_map.sql로 사전 생성한 테이블)
+shop_cls_map AS (
+  SELECT map_key, fr_or_cls
+  FROM {shop_map_table}
+)"""
+    else:
+        shop_cls_map_ctes = SHOP_CLS_MAP_CTES
+
+    remark_long_table = os.getenv(REMARK_LONG_TABLE_ENV)
+    if remark_long_table:
+        # 판매일의 remark_num과 일치하는 remark 한 칸만 조인 (SELECT 별칭은 ON 절에서 참조 불가 → 식 반복)
+        remark_join = f"""
+  LEFT JOIN {remark_long_table} rl
+    ON s.prdt_scs_cd = rl.prdt_scs_cd
+    AND rl.remark_num = FLOOR(((YEAR(s.sale_dt) - 2023) * 12 + MONTH(s.sale_dt) - 12) / 3) + 1"""
+        remark_op_std = "rl.op_std"
+    else:
+        remark_join = ""
+        # 조회 기간에 해당하는 remark 컬럼만 배열에 넣어 조인 후 projection 폭을 줄임
+        first_remark = max(_remark_num(start_month), 1)
+        last_remark = min(_remark_num(end_month), REMARK_COUNT)
+        if first_remark <= last_remark:
+            remark_cols = ', '.join(f"p.remark{i}" for i in range(first_remark, last_remark + 1))
+            remark_op_std = f"""GET(
+        ARRAY_CONSTRUCT({remark_cols}),
+        remark_num - {first_remark}
+      )::VARCHAR"""
+        else:
+            # 조회 기간이 remark 구간(24.01~25.11)과 겹치지 않음
+            remark_op_std = "NULL"
+
+    # 브랜드 코드 → 표시명 (M → MLB 등)은 최종 SELECT에서 변환 (BRAND_CODE_MAP 기준)
+    brand_name_case = "CASE brd_cd " + " ".join(
+        f"WHEN '{code}' THEN '{name}'" for code, name in BRAND_CODE_MAP.items()
+    ) + " ELSE brd_cd END"
+
+    sales_agg_table = os.getenv(SALES_AGG_TABLE_ENV)
+    if sales_agg_table:
+        # 원천/사전 집계 경계월: 기준월과 (테이블 적재 마지막 월 + 1) 중 이른 쪽
+        # (TASK 갱신 전이라 테이블에 없는 마감월은 원천에서 계산, 빈 테이블이면 전체 원천 계산)
+        sales_agg_cutoff_cte = f"""
+-- 사전 집계 테이블 사용 시 원천 계산 시작월
+sales_agg_cutoff AS (
+  SELECT LEAST(
+    TO_DATE(%(reference_month)s, 'YYYYMM'),
+    COALESCE(DATEADD(month, 1, TO_DATE(MAX(sale_ym), 'YYYYMM')), DATE '2023-12-01')
+  ) AS live_from
+  FROM {sales_agg_table}
+),
+"""
+        live_month_filter = "AND s.sale_dt >= (SELECT live_from FROM sales_agg_cutoff)"
+        closed_month_rows = f"""
+  UNION ALL
+  SELECT TO_DATE(sale_ym, 'YYYYMM') AS sale_month, brd_cd, prdt_kind_nm_en, fr_or_cls, product_type, total_amount AS amount
+  FROM {sales_agg_table}
+  WHERE sale_ym BETWEEN %(start_month)s AND %(end_month)s
+    AND TO_DATE(sale_ym, 'YYYYMM') < (SELECT live_from FROM sales_agg_cutoff)"""
+    else:
+        sales_agg_cutoff_cte = ""
+        live_month_filter = ""
+        closed_month_rows = ""
+
     query = f"""
 WITH 
 -- ACC 아이템 맵: DB_PRDT에서 DISTINCT ITEM, PRDT_KIND_NM_ENG 추출
@@ -63,158 +190,168 @@ acc_item_map AS (
   WHERE PARENT_PRDT_KIND_NM_ENG = 'ACC'
 ),
 
--- Step 1: 판매 데이터에 상품/매장 마스터 조인 및 remark 자동 계산
+{shop_cls_map_ctes},
+
+-- 고정 운영기준 → 주력/아울렛 매핑 (소형 정적 dim, 판정 단계에서 hash join 1회)
+op_std_dim AS (
+  SELECT op_std, fixed_type
+  FROM (VALUES
+    ('FOCUS', 'core'),
+    ('INTRO', 'core'),
+    ('OUTLET', 'outlet'),
+    ('CARE', 'outlet'),
+    ('DONE', 'outlet')
+  ) AS v(op_std, fixed_type)
+),
+{sales_agg_cutoff_cte}
+-- Step 1: 판매 데이터에 상품/매장 마스터 조인 및 동적 operate_standard(op_std) 선택
 -- operate_standard 규칙:
---   판매월 = {reference_month} → MST 실시간 (p.operate_standard)
---   25.12 <= 판매월 < {reference_month} → HST 익월 스냅샷 (ADD_MONTHS 1) — 구 PREP_MST_PRDT_SCS 대체
+--   판매월 = 기준월 → MST 실시간 (p.operate_standard)
+--   25.12 <= 판매월 < 기준월 → HST 익월 스냅샷 (ADD_MONTHS 1) — 구 PREP_MST_PRDT_SCS 대체
 --   24.01 ~ 25.11 → remark1~8
+-- op_std를 이 단계에서 바로 계산하여 remark1~8 등 넓은 컬럼이 이후 CTE로 전파되지 않도록 함
 sales_with_master AS (
   SELECT
-    s.sale_dt,
-    TO_CHAR(s.sale_dt, 'YYYYMM') AS sale_ym,
-    s.shop_id,
-    s.prdt_scs_cd,
+    -- 판매월은 DATE(월 첫날)로만 들고 다니고 YYYY.MM 문자열 변환은 최종 집계 단계에서 그룹당 1회
+    DATE_TRUNC('month', s.sale_dt) AS sale_month,
     s.brd_cd,
-    s.sesn,
     s.tag_amt,
     db.PRDT_KIND_NM_ENG AS prdt_kind_nm_en,
-    COALESCE(map_norm.fr_or_cls, map_cn.fr_or_cls, map_internal.fr_or_cls) AS fr_or_cls,
+    sm.fr_or_cls,
     -- remark 번호 자동 계산 (23.12 기준, 3개월 단위) → remark1~8: 24.01~25.11
-    FLOOR(DATEDIFF('month', TO_DATE('202312', 'YYYYMM'), s.sale_dt) / 3) + 1 AS remark_num,
-    -- 해당 판매일의 연도 YY (2024 → 24)
-    SUBSTR(TO_CHAR(s.sale_dt, 'YYYY'), 3, 2) AS row_yy,
-    p.remark1, p.remark2, p.remark3, p.remark4, p.remark5,
-    p.remark6, p.remark7, p.remark8,
-    -- MST 실시간 operate_standard (기준월에 사용)
-    p.operate_standard AS mst_operate_standard,
-    -- HST 익월 스냅샷 (25.12 ~ 기준월 미만에 사용, 구 PREP_MST_PRDT_SCS 대체)
-    hst.operate_standard AS prep_operate_standard
+    -- 23.12 기준 경과 개월수를 날짜 파싱 없이 정수 연산으로 계산
+    FLOOR(((YEAR(s.sale_dt) - 2023) * 12 + MONTH(s.sale_dt) - 12) / 3) + 1 AS remark_num,
+    -- 판매 연도 YY 정수 (2024 → 24), 시즌 YY 정수 (24SS → 24): 판정 단계에서 정수 비교만 수행
+    YEAR(s.sale_dt) - 2000 AS row_yy_n,
+    TRY_TO_NUMBER(LEFT(s.sesn, 2)) AS sesn_yy,
+    CASE 
+      -- 기준월: MST 실시간
+      WHEN sale_month = TO_DATE(%(reference_month)s, 'YYYYMM') THEN p.operate_standard
+      -- 25.12 ~ 기준월 미만: HST 익월 스냅샷 (구 PREP)
+      WHEN sale_month >= DATE '2025-12-01' AND sale_month < TO_DATE(%(reference_month)s, 'YYYYMM') THEN hst.operate_standard
+      -- 24.01~25.11: 분기별 remark (remark1~8) → 배열 인덱스 또는 룩업 테이블로 선택 (범위 밖이면 NULL)
+      ELSE {remark_op_std}
+    END AS op_std
   FROM CHN.DW_SALE s
-  LEFT JOIN FNF.CHN.MST_PRDT_SCS p ON s.prdt_scs_cd = p.prdt_scs_cd
-  LEFT JOIN acc_item_map db ON SUBSTR(s.prdt_scs_cd, 7, 2) = db.ITEM
+  -- 필터 조인(ACC 아이템, FR/OR 매장)을 INNER JOIN으로 먼저 수행 → 마스터 조인 전에 판매 행 축소
+  INNER JOIN acc_item_map db ON SUBSTR(s.prdt_scs_cd, 7, 2) = db.ITEM
+  -- 3-way 매장 매핑 (norm → cn → internal) 결과를 한 번의 조인으로 적용 (HQ 제외, mapped만)
+  INNER JOIN shop_cls_map sm
+    ON TO_VARCHAR(s.shop_id) = sm.map_key
+    AND sm.fr_or_cls IN ('FR', 'OR')
+  LEFT JOIN FNF.CHN.MST_PRDT_SCS p ON s.prdt_scs_cd = p.prdt_scs_cd{remark_join}
   -- HST 익월 조인 (구 PREP): 25.12 <= 판매월 < 기준월만 매칭, 기준월은 NULL (MST 사용)
   LEFT JOIN FNF.CHN.HST_PRDT_SCS hst
     ON s.prdt_scs_cd = hst.prdt_scs_cd
     AND hst.yyyymm = CASE
-      WHEN TO_CHAR(s.sale_dt, 'YYYYMM') >= '202512'
-        AND TO_CHAR(s.sale_dt, 'YYYYMM') < '{reference_month}'
-        THEN TO_VARCHAR(ADD_MONTHS(TO_DATE(TO_CHAR(s.sale_dt, 'YYYYMM') || '01', 'YYYYMMDD'), 1), 'YYYYMM')
+      WHEN s.sale_dt >= DATE '2025-12-01'
+        AND s.sale_dt < TO_DATE(%(reference_month)s, 'YYYYMM')
+        THEN TO_VARCHAR(ADD_MONTHS(DATE_TRUNC('month', s.sale_dt), 1), 'YYYYMM')
       ELSE NULL
     END
-  -- 3-way 매장 매핑 (norm → cn → internal)
-  LEFT JOIN (
-    SELECT 
-      TO_VARCHAR(oa_map_shop_id) AS norm_key,
-      fr_or_cls
-    FROM CHN.DW_SHOP_WH_DETAIL
-    WHERE fr_or_cls IS NOT NULL
-      AND oa_map_shop_id IS NOT NULL
-    QUALIFY ROW_NUMBER() OVER(
-      PARTITION BY oa_map_shop_id 
-      ORDER BY open_dt DESC NULLS LAST
-    ) = 1
-  ) map_norm ON TO_VARCHAR(s.shop_id) = map_norm.norm_key
-  LEFT JOIN (
-    SELECT 
-      TO_VARCHAR(oa_shop_id) AS cn_key,
-      TO_VARCHAR(oa_map_shop_id) AS norm_key,
-      fr_or_cls
-    FROM CHN.DW_SHOP_WH_DETAIL
-    WHERE fr_or_cls IS NOT NULL
-      AND oa_shop_id IS NOT NULL
-    QUALIFY ROW_NUMBER() OVER(
-      PARTITION BY oa_shop_id 
-      ORDER BY open_dt DESC NULLS LAST
-    ) = 1
-  ) map_cn ON TO_VARCHAR(s.shop_id) = map_cn.cn_key
-  LEFT JOIN (
-    SELECT 
-      TO_VARCHAR(shop_id) AS internal_key,
-      TO_VARCHAR(oa_map_shop_id) AS norm_key,
-      fr_or_cls
-    FROM CHN.DW_SHOP_WH_DETAIL
-    WHERE fr_or_cls IS NOT NULL
-      AND shop_id IS NOT NULL
-    QUALIFY ROW_NUMBER() OVER(
-      PARTITION BY shop_id 
-      ORDER BY open_dt DESC NULLS LAST
-    ) = 1
-  ) map_internal ON TO_VARCHAR(s.shop_id) = map_internal.internal_key
-  WHERE TO_CHAR(s.sale_dt, 'YYYYMM') >= '{start_month}'
-    AND TO_CHAR(s.sale_dt, 'YYYYMM') <= '{end_month}'
+  -- sale_dt를 함수로 감싸지 않은 DATE 범위 비교 → sale_dt 기준 micro-partition pruning 가능
+  WHERE s.sale_dt >= TO_DATE(%(start_month)s, 'YYYYMM')
+    AND s.sale_dt < DATEADD(month, 1, TO_DATE(%(end_month)s, 'YYYYMM'))
+    -- remark1~8(remark_num 1~8) 구간 + 25.12~ 구간 = 23.12 이후 전체 → 파생 키 대신 sale_dt 범위로 필터
+    AND s.sale_dt >= DATE '2023-12-01'
     AND s.brd_cd IN ('M', 'I', 'X')
-    AND db.ITEM IS NOT NULL -- ACC 필터
-    AND COALESCE(map_norm.fr_or_cls, map_cn.fr_or_cls, map_internal.fr_or_cls) IN ('FR', 'OR')  -- HQ 제외, mapped만
-),
-
--- Step 2: 동적 operate_standard 선택
--- 24.01~25.11: remark1~8, 25.12~(기준월 미만): PREP 익월, 기준월: MST 실시간
-sales_with_remark AS (
-  SELECT 
-    s.*,
-    CASE 
-      -- 기준월: MST 실시간
-      WHEN s.sale_ym = '{reference_month}' THEN s.mst_operate_standard
-      -- 25.12 ~ 기준월 미만: PREP 익월 스냅샷
-      WHEN s.sale_ym >= '202512' AND s.sale_ym < '{reference_month}' THEN s.prep_operate_standard
-      -- 24.01~25.11: 분기별 remark (remark1~8)
-      WHEN s.remark_num = 1 THEN s.remark1
-      WHEN s.remark_num = 2 THEN s.remark2
-      WHEN s.remark_num = 3 THEN s.remark3
-      WHEN s.remark_num = 4 THEN s.remark4
-      WHEN s.remark_num = 5 THEN s.remark5
-      WHEN s.remark_num = 6 THEN s.remark6
-      WHEN s.remark_num = 7 THEN s.remark7
-      WHEN s.remark_num = 8 THEN s.remark8
-      ELSE NULL
-    END AS op_std
-  FROM sales_with_master s
-  WHERE (s.sale_ym >= '202512' OR (s.remark_num >= 1 AND s.remark_num <= 8))
+    {live_month_filter}
 ),
 
--- Step 3: 주력/아울렛 판정
+-- Step 2: 주력/아울렛 판정
 sales_classified AS (
   SELECT 
-    sale_ym,
-    brd_cd,
-    prdt_kind_nm_en,
-    fr_or_cls,
-    tag_amt,
+    r.sale_month,
+    r.brd_cd,
+    r.prdt_kind_nm_en,
+    r.fr_or_cls,
+    r.tag_amt,
     -- 주력/아울렛 판정 로직
-    CASE
-      -- 1. op_std가 있으면 우선 판단
-      WHEN op_std IN ('FOCUS', 'INTRO') THEN 'core'
-      WHEN op_std IN ('OUTLET', 'CARE', 'DONE') THEN 'outlet'
-      
-      -- 2. op_std가 숫자+시즌 형태면 연도 비교
-      WHEN op_std IS NOT NULL AND op_std NOT IN ('FOCUS', 'INTRO', 'OUTLET', 'CARE', 'DONE') THEN
-        CASE 
-          WHEN TRY_TO_NUMBER(REGEXP_SUBSTR(op_std, '\\\\d{{2}}')) >= TRY_TO_NUMBER(row_yy) THEN 'core'
-          ELSE 'outlet'
-        END
-      
-      -- 3. op_std가 NULL이면 sesn으로 판단
-      WHEN TRY_TO_NUMBER(LEFT(sesn, 2)) >= TRY_TO_NUMBER(row_yy) THEN 'core'
-      
-      -- 4. 그 외 모두 아울렛
-      ELSE 'outlet'
-    END AS product_type
-  FROM sales_with_remark
+    COALESCE(
+      -- 1. op_std가 FOCUS/INTRO/OUTLET/CARE/DONE이면 dim 매핑값
+      d.fixed_type,
+      CASE
+        -- 2. op_std가 숫자+시즌 형태면 연도 비교
+        WHEN r.op_std IS NOT NULL THEN
+          CASE 
+            WHEN TRY_TO_NUMBER(REGEXP_SUBSTR(r.op_std, '\\\\d{{2}}')) >= r.row_yy_n THEN 'core'
+            ELSE 'outlet'
+          END
+        
+        -- 3. op_std가 NULL이면 sesn으로 판단
+        WHEN r.sesn_yy >= r.row_yy_n THEN 'core'
+        
+        -- 4. 그 외 모두 아울렛
+        ELSE 'outlet'
+      END
+    ) AS product_type
+  FROM sales_with_master r
+  LEFT JOIN op_std_dim d ON r.op_std = d.op_std
+),
+
+-- 원천 판정 행 (+ SNOWFLAKE_SALES_AGG_TABLE 설정 시 마감월 사전 집계 행)
+sales_rows AS (
+  SELECT sale_month, brd_cd, prdt_kind_nm_en, fr_or_cls, product_type, tag_amt AS amount
+  FROM sales_classified{closed_month_rows}
 )
 
--- Step 4: 최종 집계
+-- Step 3: 최종 집계
+-- GROUPING SETS로 아이템탭(전체/개별) × 채널(전체/FR/OR) 전개까지 Snowflake에서 처리
+-- 롤업 행 판별은 GROUPING()으로 수행 (실제 NULL 값이 '전체'로 섞이지 않도록)
 SELECT 
-  sale_ym AS month,
-  brd_cd AS brand,
-  prdt_kind_nm_en AS item_category,
-  fr_or_cls AS channel,
+  TO_CHAR(sale_month, 'YYYY.MM') AS month,
+  {brand_name_case} AS brand,
+  CASE WHEN GROUPING(prdt_kind_nm_en) = 1 THEN '전체' ELSE prdt_kind_nm_en END AS item_tab,
+  -- 채널 매핑: Snowflake 'FR' → Python 'FRS'
+  CASE WHEN GROUPING(fr_or_cls) = 1 THEN '전체' WHEN fr_or_cls = 'FR' THEN 'FRS' ELSE fr_or_cls END AS channel,
   product_type,
-  SUM(tag_amt) AS total_amount
-FROM sales_classified
-GROUP BY sale_ym, brd_cd, prdt_kind_nm_en, fr_or_cls, product_type
-ORDER BY sale_ym, brd_cd, item_category, channel, product_type
+  SUM(amount) AS total_amount
+FROM sales_rows
+GROUP BY GROUPING SETS (
+  (sale_month, brd_cd, prdt_kind_nm_en, fr_or_cls, product_type),
+  (sale_month, brd_cd, prdt_kind_nm_en, product_type),
+  (sale_month, brd_cd, fr_or_cls, product_type),
+  (sale_month, brd_cd, product_type)
+)
 """
-    return query
+    params = {
+        'start_month': start_month,
+        'end_month': end_month,
+        'reference_month': reference_month,
+    }
+    return query, params
+
+
+def _interned_values(column: pd.Series) -> List[str]:
+    """
+    문자열 컬럼을 intern된 str 리스트로 변환 (고유값만 intern 후 코드 배열로 펼침)
+
+    배치가 달라도 같은 값은 한 객체를 공유하므로 dict 키 튜플 해시/비교가
+    캐시된 문자열 해시와 포인터 비교로 끝난다. (pandas 3의 str dtype은 Arrow 버퍼라
+    category 이름을 intern해도 tolist()에서 새 객체가 만들어지므로 object 배열로 take)
+    """
+    codes, uniques = pd.factorize(column, use_na_sentinel=False)
+    interned = np.array(
+        [sys.intern(value) if isinstance(value, str) else value for value in uniques],
+        dtype=object,
+    )
+    return interned[codes].tolist()
+
+
+def result_frame_to_agg_dict(df: pd.DataFrame) -> Dict[Tuple, float]:
+    """
+    판매 집계 쿼리 결과(DataFrame)를 (brand, item_tab, month, channel, product_type) → amount로 변환
+
+    GROUPING SETS 결과는 키 조합당 1행이므로 재집계 없이 컬럼 배열을 그대로 묶는다.
+    브랜드 표시명 / 채널 FR → FRS / 월 YYYY.MM 변환은 SQL 최종 SELECT에서 완료됨.
+    """
+    if df.empty:
+        return {}
+    
+    amounts = pd.to_numeric(df['TOTAL_AMOUNT'], errors='coerce').fillna(0.0).astype(float)
+    # 결과 컬럼명(대문자)이 AGG_KEY_COLUMNS와 같은 순서/이름으로 나옴
+    key_columns = [_interned_values(df[col.upper()]) for col in AGG_KEY_COLUMNS]
+    return dict(zip(zip(*key_columns), amounts.tolist()))
 
 
 def aggregate_sales_from_snowflake(
@@ -235,50 +372,93 @@ def aggregate_sales_from_snowflake(
         Tuple[Dict, Set]: 
             - Dict: (brand, item_tab, month, channel, product_type) → amount
             - Set: 예상치 못한 카테고리 (빈 set 반환)
+
+    Note:
+        SNOWFLAKE_SALES_MONTH_WORKERS > 1이면 월별 쿼리로 나눠 병렬 조회 (aggregate_sales_parallel)
     """
     ref = reference_month if reference_month else end_month
+
+    workers = int(os.getenv(SALES_MONTH_WORKERS_ENV, '1'))
+    if workers > 1 and start_month != end_month:
+        return aggregate_sales_parallel(start_month, end_month, reference_month=ref, workers=workers)
+
     print(f"[판매] Snowflake에서 데이터 조회 중... ({start_month} ~ {end_month}), 기준월(ref)={ref}")
 
-    query = build_sales_aggregation_query(start_month, end_month, ref)
-    results = execute_query_batch(query)
-    
-    print(f"[판매] 조회 완료: {len(results):,}행")
+    query, params = build_sales_aggregation_query(start_month, end_month, ref)
     
-    # 집계 결과를 기존 형식으로 변환
-    agg_dict: Dict[Tuple, float] = defaultdict(float)
+    # (아이템탭 "전체" 및 채널 "전체" 전개는 SQL GROUPING SETS에서 완료됨)
+    if is_query_cache_enabled():
+        # 같은 쿼리/파라미터 결과는 scripts/.cache parquet에서 재사용 (TTL 내)
+        df = execute_query_pandas_cached(query, params, cache_tag=f"sales_{start_month}_{end_month}")
+        row_count = len(df)
+        agg_dict: Dict[Tuple, float] = result_frame_to_agg_dict(df)
+    else:
+        # 캐시 미사용: Arrow 청크 단위로 받아 바로 dict에 합침 (전체 결과 DataFrame을 한 번에 들고 있지 않음)
+        agg_dict = {}
+        row_count = 0
+        for batch in execute_query_pandas_batches(query, params):
+            row_count += len(batch)
+            agg_dict.update(result_frame_to_agg_dict(batch))
     
-    for row in results:
-        month_yyyymm = row['MONTH']  # YYYYMM
-        month_display = f"{month_yyyymm[:4]}.{month_yyyymm[4:6]}"  # YYYY.MM
-        
-        brand_code = row['BRAND']
-        brand_name = BRAND_CODE_MAP.get(brand_code, brand_code)
-        
-        item_category = row['ITEM_CATEGORY']
-        channel_raw = row['CHANNEL']
-        # 채널 매핑: Snowflake 'FR' → Python 'FRS'
-        channel = 'FRS' if channel_raw == 'FR' else channel_raw
-        product_type = row['PRODUCT_TYPE']
-        amount = float(row['TOTAL_AMOUNT']) if row['TOTAL_AMOUNT'] else 0.0
-        
-        # 아이템탭: "전체" + 개별 카테고리
-        item_tabs = ['전체', item_category]
-        
-        for item_tab in item_tabs:
-            # 전체판매 (FRS + OR)
-            key_total = (brand_name, item_tab, month_display, '전체', product_type)
-            agg_dict[key_total] += amount
-            
-            # 채널별 판매
-            key_channel = (brand_name, item_tab, month_display, channel, product_type)
-            agg_dict[key_channel] += amount
+    print(f"[판매] 조회 완료: {row_count:,}행")
     
     print(f"[판매] 집계 완료: {len(agg_dict):,}개 키")
     
     # 예상치 못한 카테고리는 빈 set (Snowflake에서 이미 필터링됨)
     unexpected_categories = set()
     
-    return dict(agg_dict), unexpected_categories
+    return agg_dict, unexpected_categories
+
+
+
+def _month_range(start_month: str, end_month: str) -> List[str]:
+    """start_month ~ end_month (YYYYMM, 양 끝 포함) 월 목록"""
+    year, month = int(start_month[:4]), int(start_month[4:6])
+    months = []
+    while f"{year:04d}{month:02d}" <= end_month:
+        months.append(f"{year:04d}{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def aggregate_sales_parallel(
+    start_month: str,
+    end_month: str,
+    reference_month: str = None,
+    workers: int = 4
+) -> Tuple[Dict[Tuple, float], Set[str]]:
+    """
+    판매 집계를 월별 쿼리로 나눠 스레드 풀에서 동시에 조회한 뒤 합침
+
+    월마다 결과 캐시(Snowflake / 디스크)를 따로 타므로 이미 조회한 월은 재사용되고,
+    새 월만 warehouse에서 계산된다. 월이 키에 포함되어 월별 결과의 키가 겹치지 않으므로
+    합산 없이 dict.update로 합친다. (스레드들은 snowflake_utils 공유 연결에서 cursor만 따로 연다)
+
+    Args:
+        start_month: 시작월 (YYYYMM)
+        end_month: 종료월 (YYYYMM)
+        reference_month: 기준월 (YYYYMM). None이면 end_month를 사용 (모든 월 쿼리에 동일하게 적용).
+        workers: 동시 실행 쿼리 수
+
+    Returns:
+        Tuple[Dict, Set]: aggregate_sales_from_snowflake와 동일
+    """
+    ref = reference_month if reference_month else end_month
+    months = _month_range(start_month, end_month)
+    print(f"[판매] 월별 병렬 조회: {len(months)}개월, workers={workers}, 기준월(ref)={ref}")
+
+    agg_dict: Dict[Tuple, float] = {}
+    with ThreadPoolExecutor(max_workers=min(workers, len(months)) or 1) as executor:
+        futures = [
+            executor.submit(aggregate_sales_from_snowflake, month, month, ref)
+            for month in months
+        ]
+        for future in futures:
+            month_dict, _ = future.result()
+            agg_dict.update(month_dict)
+
+    print(f"[판매] 월별 병렬 집계 완료: {len(agg_dict):,}개 키")
+    return agg_dict, set()
 
 
 if __name__ == "__main__":
@@ -291,7 +471,8 @@ if __name__ == "__main__":
         agg_dict, unexpected = aggregate_sales_from_snowflake('202511', '202511')
         
         print(f"\n집계 결과 샘플 (2025.11 MLB):")
-        for key, value in list(agg_dict.items())[:10]:
+        # SQL에 ORDER BY가 없으므로 출력용으로만 정렬
+        for key, value in sorted(agg_dict.items())[:10]:
             brand, item_tab, month, channel, ptype = key
             if brand == 'MLB' and month == '2025.11':
                 print(f"  {brand} / {item_tab} / {channel} / {ptype}: {value:,.0f}")
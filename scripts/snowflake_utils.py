@@ -9,11 +9,25 @@ Snowflake 연결 및 쿼리 실행 유틸리티
 - SNOWFLAKE_DATABASE
 - SNOWFLAKE_SCHEMA
 - SNOWFLAKE_ROLE
+
+선택 환경변수 (쿼리 결과 캐시):
+- SNOWFLAKE_QUERY_CACHE: '1'이면 디스크 캐시 활성화 (기본 비활성, TTL 내에는 MST 실시간 변경이 반영되지 않음)
+- SNOWFLAKE_QUERY_CACHE_TTL_HOURS: 캐시 유효 시간 (기본 6시간)
+
+선택 환경변수 (전처리 작업 warehouse 크기):
+- SNOWFLAKE_JOB_WAREHOUSE_SIZE: 지정 시 전처리 작업 동안만 warehouse 크기 변경 후 원복 (예: LARGE)
 """
 
 import snowflake.connector
+import atexit
+import hashlib
 import os
-from typing import List, Dict, Any, Optional
+import threading
+import time
+import uuid
+import pandas as pd
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Optional
 from pathlib import Path
 from dotenv import load_dotenv
 from cryptography.hazmat.primitives import serialization
@@ -25,6 +39,19 @@ if env_path.exists():
 else:
     print(f"[WARNING] .env.local 파일을 찾을 수 없습니다: {env_path}")
 
+# 쿼리 결과 디스크 캐시 (scripts/.cache/{hash}_{tag}.parquet)
+QUERY_CACHE_DIR = Path(__file__).parent / '.cache'
+QUERY_CACHE_TTL_SECONDS = float(os.getenv('SNOWFLAKE_QUERY_CACHE_TTL_HOURS', '6')) * 3600
+# lock 파일 생성 후 이 시간이 지나도 남아 있으면 소유 프로세스가 비정상 종료한 stale lock으로 간주
+QUERY_CACHE_LOCK_TIMEOUT_SECONDS = 30 * 60
+
+# 프로세스 내 메모리 캐시: cache key → DataFrame
+_query_memory_cache: Dict[str, pd.DataFrame] = {}
+
+# 쿼리 실행 함수들이 공유하는 프로세스 단위 연결 (최초 사용 시 생성, 종료 시 atexit로 close)
+_shared_connection: Optional[snowflake.connector.SnowflakeConnection] = None
+_shared_connection_lock = threading.Lock()
+
 
 def _load_private_key_bytes() -> bytes:
     """SNOWFLAKE_PRIVATE_KEY 환경변수를 DER 바이트로 변환"""
@@ -71,13 +98,42 @@ def get_snowflake_connection() -> snowflake.connector.SnowflakeConnection:
             warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
             database=os.getenv('SNOWFLAKE_DATABASE'),
             schema=os.getenv('SNOWFLAKE_SCHEMA'),
-            role=os.getenv('SNOWFLAKE_ROLE', 'PUBLIC')  # role은 선택적
+            role=os.getenv('SNOWFLAKE_ROLE', 'PUBLIC'),  # role은 선택적
+            # 동일 쿼리 재실행 시 Snowflake 결과 캐시(24h) 재사용 - 계정/사용자 설정과 무관하게 명시
+            session_parameters={'USE_CACHED_RESULT': True},
         )
         return conn
     except Exception as e:
         raise ConnectionError(f"Snowflake 연결 실패: {e}")
 
 
+def get_shared_connection() -> snowflake.connector.SnowflakeConnection:
+    """
+    프로세스 내 공유 Snowflake 연결 반환 (없거나 닫혔으면 새로 연결)
+
+    쿼리마다 인증/TLS 핸드셰이크를 반복하지 않도록 execute_query* 함수들이 재사용한다.
+    connector 연결은 스레드 간 공유가 가능하므로(threadsafety=2) 병렬 조회 시에도 같은 연결에서
+    스레드별 cursor를 연다. 임시 테이블 등 세션 상태가 필요한 경우에는 get_snowflake_connection 사용.
+    """
+    global _shared_connection
+    with _shared_connection_lock:
+        if _shared_connection is None or _shared_connection.is_closed():
+            _shared_connection = get_snowflake_connection()
+        return _shared_connection
+
+
+def close_shared_connection() -> None:
+    """공유 연결 종료 (프로세스 종료 시 atexit로 자동 호출)"""
+    global _shared_connection
+    with _shared_connection_lock:
+        if _shared_connection is not None:
+            _shared_connection.close()
+            _shared_connection = None
+
+
+atexit.register(close_shared_connection)
+
+
 def execute_query(query: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
     """
     Snowflake 쿼리 실행 및 결과 반환
@@ -92,20 +148,16 @@ def execute_query(query: str, params: Optional[Dict[str, Any]] = None) -> List[D
     Example:
         results = execute_query("SELECT * FROM table WHERE id = %(id)s", {'id': 123})
     """
-    conn = None
+    cursor = None
     try:
-        conn = get_snowflake_connection()
-        cursor = conn.cursor(snowflake.connector.DictCursor)
+        cursor = get_shared_connection().cursor(snowflake.connector.DictCursor)
 
         if params:
             cursor.execute(query, params)
         else:
             cursor.execute(query)
 
-        results = cursor.fetchall()
-        cursor.close()
-
-        return results
+        return cursor.fetchall()
 
     except Exception as e:
         print(f"[ERROR] 쿼리 실행 실패:")
@@ -114,46 +166,281 @@ def execute_query(query: str, params: Optional[Dict[str, Any]] = None) -> List[D
         raise
 
     finally:
-        if conn:
-            conn.close()
+        if cursor:
+            cursor.close()
 
 
-def execute_query_batch(query: str, batch_size: int = 10000) -> List[Dict[str, Any]]:
+def execute_query_pandas_batches(
+    query: str,
+    params: Optional[Dict[str, Any]] = None
+) -> Iterator[pd.DataFrame]:
     """
-    대용량 쿼리를 배치로 실행하여 메모리 효율적으로 처리
+    쿼리 결과를 Arrow 결과 청크 단위 DataFrame으로 yield (fetch_pandas_batches)
 
     Args:
         query: 실행할 SQL 쿼리
-        batch_size: 한 번에 가져올 행 수
+        params: 쿼리 파라미터 (선택적)
 
-    Returns:
-        List[Dict[str, Any]]: 전체 쿼리 결과
+    Yields:
+        pd.DataFrame: 결과 청크 (컬럼명은 Snowflake 기본 대문자)
     """
-    conn = None
-    all_results = []
+    cursor = None
+    try:
+        cursor = get_shared_connection().cursor()
+
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+
+        loaded = 0
+        for df in cursor.fetch_pandas_batches():
+            loaded += len(df)
+            print(f"  DataFrame 배치 로드: {loaded:,}행...")
+            yield df
 
+    except Exception as e:
+        print(f"[ERROR] DataFrame 배치 쿼리 실행 실패: {e}")
+        raise
+
+    finally:
+        if cursor:
+            cursor.close()
+
+
+def execute_query_pandas(query: str, params: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """
+    Snowflake 쿼리를 실행하여 pandas DataFrame으로 반환 (Arrow 결과 포맷)
+
+    행마다 dict를 만드는 DictCursor 대신 fetch_pandas_all()로 컬럼 단위 수신하므로
+    집계 후처리를 pandas 벡터 연산으로 바로 이어갈 수 있음
+
+    Args:
+        query: 실행할 SQL 쿼리
+        params: 쿼리 파라미터 (선택적)
+
+    Returns:
+        pd.DataFrame: 쿼리 결과 (컬럼명은 Snowflake 기본 대문자)
+    """
+    cursor = None
     try:
-        conn = get_snowflake_connection()
-        cursor = conn.cursor(snowflake.connector.DictCursor)
-        cursor.execute(query)
+        cursor = get_shared_connection().cursor()
+
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
 
-        while True:
-            batch = cursor.fetchmany(batch_size)
-            if not batch:
-                break
-            all_results.extend(batch)
-            print(f"  배치 로드: {len(all_results):,}행...")
+        df = cursor.fetch_pandas_all()
 
-        cursor.close()
-        return all_results
+        print(f"  DataFrame 로드: {len(df):,}행")
+        return df
 
     except Exception as e:
-        print(f"[ERROR] 배치 쿼리 실행 실패: {e}")
+        print(f"[ERROR] DataFrame 쿼리 실행 실패: {e}")
         raise
 
     finally:
-        if conn:
-            conn.close()
+        if cursor:
+            cursor.close()
+
+
+def is_query_cache_enabled() -> bool:
+    """
+    SNOWFLAKE_QUERY_CACHE='1'(또는 CLI --cache)일 때만 디스크 캐시 사용
+
+    기준월은 MST 실시간 operate_standard로 판정하므로 캐시 TTL 동안은 MST 변경이 결과에 반영되지 않음
+    → 같은 결과를 반복 조회하는 개발/검증 시에만 명시적으로 켠다.
+    """
+    return os.getenv('SNOWFLAKE_QUERY_CACHE', '0') == '1'
+
+
+def enable_query_cache() -> None:
+    """현재 프로세스의 쿼리 캐시 활성화 (전처리 스크립트 --cache 옵션용)"""
+    os.environ['SNOWFLAKE_QUERY_CACHE'] = '1'
+
+
+def disable_query_cache() -> None:
+    """현재 프로세스의 쿼리 캐시 비활성화 (전처리 스크립트 --no-cache 옵션용)"""
+    os.environ['SNOWFLAKE_QUERY_CACHE'] = '0'
+
+
+def _query_cache_key(query: str, params: Optional[Dict[str, Any]]) -> str:
+    """쿼리 텍스트 + 파라미터로 캐시 키(blake2b) 생성"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(query.encode('utf-8'))
+    if params:
+        digest.update(repr(sorted(params.items())).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _is_cache_fresh(path: Path, ttl_seconds: float) -> bool:
+    return path.exists() and (time.time() - path.stat().st_mtime) < ttl_seconds
+
+
+def _read_lock_token(lock_path: Path) -> Optional[str]:
+    try:
+        return lock_path.read_text(encoding='utf-8')
+    except OSError:
+        return None
+
+
+def _try_acquire_cache_lock(lock_path: Path) -> Optional[str]:
+    """O_EXCL로 lock 파일 생성 후 소유 토큰(pid-uuid) 기록. 이미 있으면 None"""
+    token = f"{os.getpid()}-{uuid.uuid4().hex}"
+    try:
+        lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None
+    with os.fdopen(lock_fd, 'w', encoding='utf-8') as f:
+        f.write(token)
+    return token
+
+
+def _release_cache_lock(lock_path: Path, token: str) -> bool:
+    """
+    lock 파일의 토큰이 token과 같을 때만 제거 (다른 프로세스가 새로 만든 lock은 건드리지 않음)
+
+    확인과 삭제 사이에 lock이 바뀌지 않도록 고유 이름으로 원자적 rename 후 토큰을 비교하고,
+    남의 lock이었으면 제자리로 되돌린다.
+    """
+    claimed_path = lock_path.with_name(f"{lock_path.name}.{uuid.uuid4().hex}")
+    try:
+        os.rename(lock_path, claimed_path)
+    except FileNotFoundError:
+        return False
+
+    if _read_lock_token(claimed_path) == token:
+        claimed_path.unlink(missing_ok=True)
+        return True
+
+    try:
+        os.link(claimed_path, lock_path)
+    except FileExistsError:
+        pass
+    claimed_path.unlink(missing_ok=True)
+    return False
+
+
+def _remove_stale_cache_lock(lock_path: Path) -> None:
+    """lock 파일 자체의 mtime 기준으로 QUERY_CACHE_LOCK_TIMEOUT_SECONDS가 지났을 때만 제거"""
+    try:
+        lock_age = time.time() - lock_path.stat().st_mtime
+    except FileNotFoundError:
+        return
+    if lock_age < QUERY_CACHE_LOCK_TIMEOUT_SECONDS:
+        return
+
+    stale_token = _read_lock_token(lock_path)
+    if stale_token is not None and _release_cache_lock(lock_path, stale_token):
+        print(f"[WARNING] 오래된 캐시 lock 제거: {lock_path.name} ({lock_age / 60:.0f}분 경과)")
+
+
+def execute_query_pandas_cached(
+    query: str,
+    params: Optional[Dict[str, Any]] = None,
+    cache_tag: str = '',
+    ttl_seconds: float = QUERY_CACHE_TTL_SECONDS,
+) -> pd.DataFrame:
+    """
+    execute_query_pandas 결과를 프로세스 메모리 + 디스크(parquet)에 캐시
+
+    같은 쿼리를 TTL 내에 다시 실행하면 Snowflake를 거치지 않고 캐시를 읽는다.
+    여러 프로세스가 동시에 같은 쿼리를 요청하면 O_EXCL lock 파일을 먼저 만든 쪽만
+    Snowflake를 조회하고, 나머지는 lock이 풀릴 때까지 기다렸다가 캐시를 읽는다.
+    lock은 생성 후 QUERY_CACHE_LOCK_TIMEOUT_SECONDS가 지난 경우에만 stale로 보고 제거하며,
+    해제는 lock에 기록한 토큰이 자기 것일 때만 한다.
+
+    Args:
+        query: 실행할 SQL 쿼리
+        params: 쿼리 파라미터 (선택적)
+        cache_tag: 캐시 파일명에 붙일 식별자 (예: "202401_202511")
+        ttl_seconds: 캐시 유효 시간 (초)
+
+    Returns:
+        pd.DataFrame: 쿼리 결과
+    """
+    if not is_query_cache_enabled():
+        return execute_query_pandas(query, params)
+
+    key = _query_cache_key(query, params)
+    if key in _query_memory_cache:
+        print("  [캐시] 메모리 캐시 사용")
+        return _query_memory_cache[key].copy()
+
+    QUERY_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    file_stem = f"{key}_{cache_tag}" if cache_tag else key
+    cache_path = QUERY_CACHE_DIR / f"{file_stem}.parquet"
+    lock_path = QUERY_CACHE_DIR / f"{file_stem}.lock"
+
+    while True:
+        if _is_cache_fresh(cache_path, ttl_seconds):
+            print(f"  [캐시] 디스크 캐시 사용: {cache_path.name}")
+            df = pd.read_parquet(cache_path)
+            _query_memory_cache[key] = df
+            return df.copy()
+
+        lock_token = _try_acquire_cache_lock(lock_path)
+        if lock_token:
+            break
+        _remove_stale_cache_lock(lock_path)
+        time.sleep(2)
+
+    try:
+        df = execute_query_pandas(query, params)
+        # 임시 파일명도 lock 토큰별로 분리 (stale 판정으로 writer가 겹쳐도 서로의 임시 파일을 덮어쓰지 않음)
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{lock_token}.tmp")
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+        _query_memory_cache[key] = df
+        return df.copy()
+    finally:
+        _release_cache_lock(lock_path, lock_token)
+
+
+@contextmanager
+def warehouse_size_override(size: Optional[str] = None):
+    """
+    블록 실행 동안만 SNOWFLAKE_WAREHOUSE 크기를 변경하고 끝나면 원래 크기로 복원
+
+    size가 없으면 SNOWFLAKE_JOB_WAREHOUSE_SIZE를 사용하고, 둘 다 없으면 아무것도 하지 않는다.
+    (warehouse ALTER 권한 필요. 동시에 도는 쿼리끼리 크기를 덮어쓰지 않도록 쿼리 단위가 아닌
+    전처리 작업 단위로 한 번만 감싸서 사용)
+
+    Example:
+        with warehouse_size_override('LARGE'):
+            main()
+    """
+    size = size or os.getenv('SNOWFLAKE_JOB_WAREHOUSE_SIZE')
+    if not size:
+        yield
+        return
+
+    warehouse = os.getenv('SNOWFLAKE_WAREHOUSE')
+    cursor = get_shared_connection().cursor(snowflake.connector.DictCursor)
+    original_size = None
+    try:
+        cursor.execute("SHOW WAREHOUSES LIKE %(warehouse)s", {'warehouse': warehouse})
+        rows = cursor.fetchall()
+        original_size = rows[0].get('size') if rows else None
+
+        print(f"[Snowflake] warehouse {warehouse} 크기 변경: {original_size} → {size}")
+        cursor.execute("ALTER WAREHOUSE IF EXISTS IDENTIFIER(%(warehouse)s) RESUME IF SUSPENDED", {'warehouse': warehouse})
+        cursor.execute(
+            "ALTER WAREHOUSE IDENTIFIER(%(warehouse)s) SET WAREHOUSE_SIZE = %(size)s WAIT_FOR_COMPLETION = TRUE",
+            {'warehouse': warehouse, 'size': size},
+        )
+        yield
+    finally:
+        try:
+            if original_size:
+                cursor.execute(
+                    "ALTER WAREHOUSE IDENTIFIER(%(warehouse)s) SET WAREHOUSE_SIZE = %(size)s",
+                    {'warehouse': warehouse, 'size': original_size},
+                )
+                print(f"[Snowflake] warehouse {warehouse} 크기 복원: {original_size}")
+        finally:
+            cursor.close()
 
 
 def test_connection() -> bool: